@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from chains.rag_chain import get_rag_chain
+from memory.conversation import get_memory
+from retriever import hybrid
+from retriever.vector_store import get_embeddings
+
+# Generations running at once; more just queue, since a CPU-bound LLM gains nothing from overlap
+LLM_CONCURRENCY = int(os.getenv("RAG_LLM_CONCURRENCY", "2"))
+
+llm_slots = None
+# One turn at a time per session, so concurrent requests don't interleave its history
+session_locks = weakref.WeakValueDictionary()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global llm_slots
+    llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+    # Loads (or builds) the index before the first request
+    await asyncio.to_thread(get_rag_chain)
+    yield
+
+
+app = FastAPI(title="RAG Activity Recommender", lifespan=lifespan)
+
+
+class ChatRequest(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+
+
+def session_lock(session_id):
+    lock = session_locks.get(session_id)
+    if lock is None:
+        lock = session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+def sources(documents):
+    return [{"content": document.page_content, **document.metadata} for document in documents]
+
+
+async def start_turn(question, session_id):
+    memory = get_memory(session_id)
+    chain = await asyncio.to_thread(get_rag_chain)
+    history = await asyncio.to_thread(memory.messages)
+    return memory, await chain.astream(question, history, llm_slots)
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    session_id = request.session_id or uuid.uuid4().hex
+    async with session_lock(session_id):
+        memory, turn = await start_turn(request.question, session_id)
+        async for _ in turn.atokens():
+            pass
+        await asyncio.to_thread(memory.save, request.question, turn.answer)
+    return {"session_id": session_id, "answer": turn.answer, "sources": sources(turn.documents), "timings": turn.timings()}
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    # Newline-delimited JSON: the retrieved context, then tokens, then timings
+    session_id = request.session_id or uuid.uuid4().hex
+
+    async def events():
+        async with session_lock(session_id):
+            memory, turn = await start_turn(request.question, session_id)
+            yield json.dumps({"type": "context", "session_id": session_id, "sources": sources(turn.documents)}) + "\n"
+            async for token in turn.atokens():
+                yield json.dumps({"type": "token", "text": token}) + "\n"
+            await asyncio.to_thread(memory.save, request.question, turn.answer)
+            yield json.dumps({"type": "done", "answer": turn.answer, "timings": turn.timings()}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    embeddings = get_embeddings()
+    chain = await asyncio.to_thread(get_rag_chain)
+    batches = embeddings.batcher.stats
+    return {
+        "embedding_cache": embeddings.stats,
+        "embedding_batches": {**batches, "average_size": round(batches["items"] / batches["batches"], 2) if batches["batches"] else 0},
+        "retrieval": hybrid.stats,
+        "response_cache": chain.cache.metrics() if chain.cache is not None else None,
+        "llm_concurrency": LLM_CONCURRENCY,
+    }
@@ -1,17 +1,37 @@
+import uuid
+
 import streamlit as st
 from chains.rag_chain import get_rag_chain
+from memory.conversation import get_memory
+
+
+def session_id():
+    # Kept in the URL, so a refresh or an app restart resumes the same conversation
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+        st.query_params["session"] = st.session_state.session_id
+    return st.session_state.session_id
+
 
 def run_chat():
+    memory = get_memory(session_id())
     if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-
-    user_input = st.chat_input("What would you like to do?")
-    if user_input:
-        with st.spinner("Thinking..."):
-            qa_chain = get_rag_chain()
-            response = qa_chain.run(user_input)
-            st.session_state.chat_history.append(("You", user_input))
-            st.session_state.chat_history.append(("Bot", response))
+        st.session_state.chat_history = [("You" if role == "human" else "Bot", msg) for role, msg in memory.turns()]
 
     for sender, msg in st.session_state.chat_history:
         st.chat_message("user" if sender == "You" else "assistant").write(msg)
+
+    user_input = st.chat_input("What would you like to do?")
+    if user_input:
+        st.chat_message("user").write(user_input)
+        with st.chat_message("assistant"):
+            with st.spinner("Searching..."):
+                turn = get_rag_chain().stream(user_input, memory.messages())
+            # The context shows while the answer is still being generated
+            with st.expander(f"Context ({len(turn.documents)} documents)"):
+                for doc in turn.documents:
+                    st.caption(doc.page_content)
+            response = st.write_stream(turn.tokens())
+        memory.save(user_input, response)
+        st.session_state.chat_history.append(("You", user_input))
+        st.session_state.chat_history.append(("Bot", response))
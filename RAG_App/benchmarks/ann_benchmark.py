@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from retriever import ann
+
+BLOCK = 100_000
+CLUSTERS = 1000
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def centers(dim, seed):
+    return np.random.default_rng(seed).standard_normal((CLUSTERS, dim)).astype(np.float32)
+
+
+def synthetic(n_vectors, dim, seed, offset=1):
+    # Unit vectors around shared cluster centers, like sentence embeddings of
+    # related text; generated block by block so 10M vectors never sit in memory twice
+    means = centers(dim, seed)
+    rng = np.random.default_rng(seed + offset)
+    for start in range(0, n_vectors, BLOCK):
+        size = min(BLOCK, n_vectors - start)
+        block = means[rng.integers(CLUSTERS, size=size)] + 0.6 * rng.standard_normal((size, dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        yield block
+
+
+def index_bytes(index):
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as f:
+        faiss.write_index(index, f.name)
+        return os.path.getsize(f.name)
+
+
+def build(index_type, n_vectors, dim, seed):
+    started = time.perf_counter()
+    sample = None
+    size = ann.training_size(index_type, n_vectors)
+    if size:
+        # Vectors come in random order, so the leading ones are a fair sample
+        blocks, taken = [], 0
+        for block in synthetic(n_vectors, dim, seed):
+            if taken >= size:
+                break
+            blocks.append(block)
+            taken += len(block)
+        sample = np.concatenate(blocks)[:size]
+    index = ann.build_index(index_type, dim, n_vectors, sample)
+    for block in synthetic(n_vectors, dim, seed):
+        index.add(block)
+    return index, time.perf_counter() - started
+
+
+def search(index, queries, k):
+    # One query at a time on one thread, like a chat request
+    threads = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(1)
+    latencies, results = [], []
+    try:
+        for query in queries:
+            started = time.perf_counter()
+            _, found = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            results.append(found[0])
+    finally:
+        faiss.omp_set_num_threads(threads)
+    return np.array(results), np.array(latencies)
+
+
+def run(sizes, index_types, dim, n_queries, k, seed):
+    rows = []
+    queries = next(synthetic(n_queries, dim, seed, offset=2))
+    for n_vectors in sizes:
+        auto = ann.choose_index_type(n_vectors, dim)
+        truth = None
+        # Flat runs first: its results are the exact neighbours recall is measured against
+        for index_type in ["flat"] + [name for name in index_types if name != "flat"]:
+            index, build_seconds = build(index_type, n_vectors, dim, seed)
+            found, latencies = search(index, queries, k)
+            if truth is None:
+                truth = found
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+            row = {
+                "vectors": n_vectors,
+                "index": index_type,
+                "auto": index_type == auto,
+                "build_s": round(build_seconds, 2),
+                "memory_mb": round(index_bytes(index) / 2 ** 20, 1),
+                f"recall@{k}": round(float(recall), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            }
+            del index
+            if index_type in index_types:
+                rows.append(row)
+                print("  ".join(f"{key}={value}" for key, value in row.items()), flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, latency and memory of the FAISS index types on synthetic corpora.")
+    parser.add_argument("--sizes", default="10k,100k,1m", help="comma-separated corpus sizes, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--types", default=",".join(ann.INDEX_TYPES), help="comma-separated index types")
+    parser.add_argument("--dim", type=int, default=384, help="vector dimension (384 for all-MiniLM-L6-v2)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    index_types = [name.strip() for name in args.types.split(",")]
+    unknown = set(index_types) - set(ann.INDEX_TYPES)
+    if unknown:
+        parser.error(f"unknown index types: {', '.join(sorted(unknown))}")
+    rows = run([parse_size(size) for size in args.sizes.split(",")], index_types, args.dim, args.queries, args.k, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"dim": args.dim, "k": args.k, "queries": args.queries, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
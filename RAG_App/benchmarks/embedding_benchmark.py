@@ -0,0 +1,116 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKENDS = ("hf", "onnx", "onnx-int8")
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+QUERIES = [
+    "I want to relax and enjoy some nature.",
+    "What can I do with friends and food?",
+    "I'm looking for something exciting outdoors.",
+    "hiking",
+]
+
+
+def load(backend, threads=0):
+    # Imports happen here, so the cold-start child only pays for its own backend
+    if backend == "hf":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=MODEL_ID)
+    from retriever.onnx_embeddings import OnnxEmbeddings
+
+    return OnnxEmbeddings(MODEL_ID, quantize=backend == "onnx-int8", threads=threads)
+
+
+def corpus_texts(paths, n_texts, seed):
+    # Chunk-sized texts made of the corpus' own chunks, so lengths and
+    # vocabulary resemble what ingestion embeds even when the corpus is small
+    from ingestion.loaders import iter_files
+    from ingestion.pipeline import CHUNK_SIZE, iter_chunks
+
+    chunks = [text for path in iter_files(paths) for _, text, _ in iter_chunks(path)]
+    if not chunks:
+        raise SystemExit(f"no documents found under {', '.join(paths)}")
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(chunks, size=rng.integers(1, 9)))[:CHUNK_SIZE] for _ in range(n_texts)]
+
+
+def cold_start(backend, threads):
+    # A fresh interpreter: imports, model load and one query, as on app start
+    code = f"from benchmarks.embedding_benchmark import load; load({backend!r}, {threads}).embed_query('warm up')"
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - started
+
+
+def neighbours(vectors, n_queries, k):
+    scores = vectors[:n_queries] @ vectors.T
+    return np.argsort(-scores, axis=1)[:, 1:k + 1]
+
+
+def run(backends, texts, threads, n_queries, k):
+    rows, reference = [], None
+    # hf runs first: the others are compared against its vectors
+    for backend in ["hf"] + [name for name in backends if name != "hf"]:
+        embeddings = load(backend, threads)
+        embeddings.embed_query("warm up")
+        started = time.perf_counter()
+        vectors = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+        seconds = time.perf_counter() - started
+        latencies = []
+        for query in QUERIES * 25:
+            started = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+        del embeddings
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        if reference is None:
+            reference = vectors, neighbours(vectors, n_queries, k)
+        cosines = np.sum(vectors * reference[0], axis=1)
+        found = neighbours(vectors, n_queries, k)
+        agreement = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, reference[1])])
+        row = {
+            "backend": backend,
+            "texts_per_s": round(len(texts) / seconds, 1),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "cold_start_s": round(cold_start(backend, threads), 2),
+            "cosine_mean": round(float(cosines.mean()), 5),
+            "cosine_min": round(float(cosines.min()), 5),
+            f"neighbours@{k}": round(float(agreement), 4),
+        }
+        if backend in backends:
+            rows.append(row)
+            print("  ".join(f"{key}={value}" for key, value in row.items()), flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agreement, throughput and cold start of the embedding backends, against sentence-transformers.")
+    parser.add_argument("paths", nargs="*", default=["corpus"], help="files or directories the benchmark texts are drawn from")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated backends")
+    parser.add_argument("--texts", type=int, default=2000, help="texts embedded for throughput and agreement")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0: one per core)")
+    parser.add_argument("--queries", type=int, default=200, help="texts whose nearest neighbours are compared")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    backends = [name.strip() for name in args.backends.split(",")]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+    texts = corpus_texts(args.paths, args.texts, args.seed)
+    rows = run(backends, texts, args.threads, min(args.queries, len(texts)), args.k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"texts": len(texts), "threads": args.threads, "k": args.k, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,194 @@
-from retriever.vector_store import get_vectorstore
-from memory.conversation import get_memory
-from langchain.chains import ConversationalRetrievalChain
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from chains.semantic_cache import RESPONSE_CACHE, SemanticCache
+from retriever.vector_store import get_embeddings, get_retriever
 from langchain.prompts import PromptTemplate
 from langchain.llms import OpenAI  # Replace with Ollama if needed
 from langchain_community.llms import Ollama
 
+log = logging.getLogger(__name__)
+
+# Rewrite follow-up questions into standalone ones before retrieval (one extra LLM call per follow-up)
+CONDENSE_QUESTION = os.getenv("RAG_CONDENSE_QUESTION", "1") == "1"
+
+_lock = threading.Lock()
+_chain = (None, None)
+
+CONDENSE_TEMPLATE = '''Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question, in its original language.
+
+Chat History:
+{chat_history}
+Follow Up Input: {question}
+Standalone question:'''
+
+
+def format_history(messages):
+    prefixes = {"human": "Human", "ai": "Assistant"}
+    return "\n".join(f"{prefixes.get(message.type, message.type)}: {message.content}" for message in messages)
+
+
+def conversation_key(history, question, query):
+    """
+    Digest of the chat history when the question was used as asked after
+    earlier turns: a follow-up like "what about the second one?" only means
+    the same thing in the same conversation. "" for a first or condensed question.
+    """
+    if not history or query != question:
+        return ""
+    return hashlib.sha256(history.encode()).hexdigest()
+
+
+class Turn:
+    """
+    One question being answered: the retrieved documents are available as
+    soon as the Turn exists, the answer arrives token by token from tokens()
+    (or atokens(), holding one of llm_slots while generating). A Turn with a
+    cached answer yields it whole without calling the LLM.
+    """
+
+    def __init__(self, chain, question, query, history, documents, started, condense_ms, retrieval_ms, llm_slots=None, cached=None,
+                 conversation=""):
+        self.chain = chain
+        self.question = question
+        # The standalone question used for retrieval and the response cache
+        self.query = query
+        self.history = history
+        self.documents = documents
+        self.started = started
+        self.condense_ms = condense_ms
+        self.retrieval_ms = retrieval_ms
+        self.llm_slots = llm_slots
+        self.cached = cached
+        # Set when the response cache must tell this conversation's follow-ups apart
+        self.conversation = conversation
+        self.first_token_ms = None
+        self.total_ms = None
+        self.answer = ""
+        self._parts = []
+
+    def _prompt(self):
+        context = "\n\n".join(document.page_content for document in self.documents)
+        return self.chain.prompt.format(context=context, chat_history=self.history, question=self.question)
+
+    def _record(self, token):
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self.started) * 1000
+        self._parts.append(token)
+
+    def _finish(self):
+        self.answer = "".join(self._parts)
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        log.info(
+            "turn timings: condense_ms=%.0f retrieval_ms=%.0f first_token_ms=%.0f total_ms=%.0f cached=%s",
+            self.condense_ms, self.retrieval_ms, self.first_token_ms or self.total_ms, self.total_ms, self.cached is not None,
+        )
+
+    def timings(self):
+        return {
+            "condense_ms": round(self.condense_ms),
+            "retrieval_ms": round(self.retrieval_ms),
+            "first_token_ms": round(self.first_token_ms or 0),
+            "total_ms": round(self.total_ms or 0),
+            "cached": self.cached is not None,
+        }
+
+    def tokens(self):
+        if self.cached is not None:
+            self._record(self.cached)
+            yield self.cached
+            self._finish()
+            return
+        for token in self.chain.llm.stream(self._prompt()):
+            self._record(token)
+            yield token
+        self._finish()
+        if self.chain.cache is not None and self.answer.strip():
+            self.chain.cache.store(self.query, self.documents, self.answer, self.conversation)
+
+    async def atokens(self):
+        if self.cached is not None:
+            self._record(self.cached)
+            yield self.cached
+            self._finish()
+            return
+        async with self.llm_slots or contextlib.nullcontext():
+            async for token in self.chain.llm.astream(self._prompt()):
+                self._record(token)
+                yield token
+        self._finish()
+        if self.chain.cache is not None and self.answer.strip():
+            self.chain.cache.store(self.query, self.documents, self.answer, self.conversation)
+
+
+class RagChain:
+    def __init__(self, llm, retriever, prompt, cache=None):
+        self.llm = llm
+        self.retriever = retriever
+        self.prompt = prompt
+        self.cache = cache
+        self.condense_prompt = PromptTemplate.from_template(CONDENSE_TEMPLATE)
+
+    def stream(self, question, chat_history=()):
+        # Retrieves right away; the answer is generated while Turn.tokens() is consumed
+        started = time.perf_counter()
+        history = format_history(chat_history)
+        query = question
+        if history and CONDENSE_QUESTION:
+            query = self.llm.invoke(self.condense_prompt.format(chat_history=history, question=question)).strip() or question
+        condensed = time.perf_counter()
+        documents = self.retriever.invoke(query)
+        retrieved = time.perf_counter()
+        conversation = conversation_key(history, question, query)
+        cached = self.cache.lookup(query, documents, conversation) if self.cache is not None else None
+        return Turn(
+            self, question, query, history, documents, started, (condensed - started) * 1000, (retrieved - condensed) * 1000,
+            cached=cached, conversation=conversation,
+        )
+
+    async def astream(self, question, chat_history=(), llm_slots=None):
+        # Like stream(); LLM calls hold one of llm_slots (an asyncio.Semaphore) so
+        # a service can bound how many generations run at once
+        started = time.perf_counter()
+        history = format_history(chat_history)
+        query = question
+        if history and CONDENSE_QUESTION:
+            async with llm_slots or contextlib.nullcontext():
+                standalone = await self.llm.ainvoke(self.condense_prompt.format(chat_history=history, question=question))
+            query = standalone.strip() or question
+        condensed = time.perf_counter()
+        documents = await self.retriever.ainvoke(query)
+        retrieved = time.perf_counter()
+        conversation = conversation_key(history, question, query)
+        cached = self.cache.lookup(query, documents, conversation) if self.cache is not None else None
+        return Turn(
+            self, question, query, history, documents, started, (condensed - started) * 1000, (retrieved - condensed) * 1000, llm_slots, cached,
+            conversation,
+        )
+
+    def invoke(self, inputs):
+        turn = self.stream(inputs["question"], inputs.get("chat_history", ()))
+        for _ in turn.tokens():
+            pass
+        return {"question": inputs["question"], "answer": turn.answer, "source_documents": turn.documents}
+
 
 def get_rag_chain():
-    retriever = get_vectorstore().as_retriever()
-    memory = get_memory()
+    # Built once per index version; the chain keeps no per-conversation state,
+    # so callers pass their own chat_history with every question
+    global _chain
+    retriever = get_retriever()
+    with _lock:
+        if _chain[0] is not retriever:
+            _chain = (retriever, _build_rag_chain(retriever))
+        return _chain[1]
+
+
+def _build_rag_chain(retriever):
 
     template = '''
 You are a helpful assistant that recommends activities based on the user's past and current inputs.
@@ -29,11 +209,6 @@ Assistant:
 
     # llm = OpenAI(temperature=0.5)
     llm = Ollama(model="llama2")
-    chain = ConversationalRetrievalChain.from_llm(
-        llm=llm,
-        retriever=retriever,
-        memory=memory,
-        combine_docs_chain_kwargs={"prompt": prompt}
-    )
-    return chain
-
+    # A new chain per index version also starts a new response cache
+    cache = SemanticCache(get_embeddings()) if RESPONSE_CACHE else None
+    return RagChain(llm, retriever, prompt, cache)
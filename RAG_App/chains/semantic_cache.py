@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import faiss
+import numpy as np
+
+RESPONSE_CACHE = os.getenv("RAG_RESPONSE_CACHE", "1") == "1"
+# Cosine similarity a past question needs to have its answer reused
+SIMILARITY_THRESHOLD = float(os.getenv("RAG_RESPONSE_CACHE_THRESHOLD", "0.92"))
+MAX_ENTRIES = int(os.getenv("RAG_RESPONSE_CACHE_SIZE", "1000"))
+TTL_SECONDS = float(os.getenv("RAG_RESPONSE_CACHE_TTL", "3600"))
+# Nearest past questions checked per lookup
+CANDIDATES = 5
+
+
+class Entry(NamedTuple):
+    question: str
+    # (normalized question, document_key of the retrieved documents, conversation)
+    key: tuple
+    answer: str
+    created: float
+
+
+def document_key(documents):
+    return frozenset(document.id or document.page_content for document in documents)
+
+
+def normalize_question(question):
+    # Case, punctuation and spacing don't change what is being asked
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class SemanticCache:
+    """
+    Answers to past questions, found again by embedding similarity.
+
+    A lookup hits when a stored question is at least ``threshold`` cosine
+    similar to the new one and was answered from the same retrieved
+    documents, so a near-duplicate question only reuses an answer grounded
+    in the same context. The cache never runs the embedding model: it uses
+    the vector retrieval left in the query cache, and questions retrieval
+    didn't embed (BM25 answered them alone) only match the same normalized
+    question over the same documents. A question that only makes sense after
+    its conversation (a follow-up that wasn't condensed) is stored and
+    looked up with that conversation's digest, and only matched exactly.
+    Entries expire after ``ttl`` seconds and the least
+    recently used go first beyond ``max_entries``. A cache belongs to one
+    chain, which is rebuilt when the corpus changes, so stale answers never
+    outlive the index they came from.
+    """
+
+    def __init__(self, embeddings, threshold=SIMILARITY_THRESHOLD, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index = None
+        self.entries = OrderedDict()
+        self.exact = {}
+        self.next_id = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1).copy()
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _evict(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        if self.exact.get(entry.key) == entry_id:
+            del self.exact[entry.key]
+        if self.index is not None:
+            self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+        self.stats["evictions"] += 1
+
+    def _hit(self, entry_id, documents, now):
+        entry = self.entries[entry_id]
+        if now - entry.created > self.ttl:
+            self._evict(entry_id)
+            return None
+        if entry.key[1] != documents:
+            return None
+        self.entries.move_to_end(entry_id)
+        self.stats["hits"] += 1
+        return entry.answer
+
+    def _vector(self, question):
+        # Only a vector retrieval already computed; on a miss the question
+        # goes without the similarity search rather than through the model
+        return self.embeddings.peek_query(question)
+
+    def lookup(self, question, documents, conversation=""):
+        documents = document_key(documents)
+        vector = None if conversation else self._vector(question)
+        with self._lock:
+            now = time.monotonic()
+            entry_id = self.exact.get((normalize_question(question), documents, conversation))
+            if entry_id is not None:
+                answer = self._hit(entry_id, documents, now)
+                if answer is not None:
+                    return answer
+            if vector is not None and self.index is not None and self.index.ntotal:
+                scores, ids = self.index.search(self._normalize(vector), min(CANDIDATES, self.index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    answer = self._hit(entry_id, documents, now)
+                    if answer is not None:
+                        return answer
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, question, documents, answer, conversation=""):
+        vector = None if conversation else self._vector(question)
+        key = (normalize_question(question), document_key(documents), conversation)
+        with self._lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            if vector is not None:
+                vector = self._normalize(vector)
+                if self.index is None:
+                    self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self.entries[entry_id] = Entry(question, key, answer, time.monotonic())
+            self.exact[key] = entry_id
+            while len(self.entries) > self.max_entries:
+                self._evict(next(iter(self.entries)))
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self.entries), "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0}
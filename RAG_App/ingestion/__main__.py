@@ -0,0 +1,39 @@
+import argparse
+import logging
+
+from ingestion.pipeline import BATCH_SIZE, CHUNK_OVERLAP, CHUNK_SIZE, WORKERS, ingest
+from retriever.vector_store import CORPUS_DIR, get_embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m ingestion", description="Sync the RAG index with PDF, CSV, Markdown and text files.")
+    parser.add_argument("paths", nargs="*", default=[CORPUS_DIR], help="files and directories to index (default: the corpus directory)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="maximum characters per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="characters repeated between neighbouring chunks")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="chunks per embedding batch")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="embedding workers")
+    parser.add_argument("--processes", action="store_true", help="embed in worker processes instead of threads")
+    parser.add_argument("--rebuild", action="store_true", help="drop the index and embed everything again")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    stats = ingest(
+        args.paths,
+        rebuild=args.rebuild,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        processes=args.processes,
+    )
+    print(
+        f"{stats['files']} files ({stats['skipped']} unchanged), "
+        f"{stats['added']} chunks added, {stats['deleted']} removed in {stats['seconds']}s"
+    )
+    if not args.processes:
+        cache = get_embeddings().stats
+        print(f"embedding cache: {cache['store_hits']} hits, {cache['misses']} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import csv
+import os
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown"}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | {".csv", ".pdf"}
+# Longest text unit a loader yields; longer paragraphs are cut so memory stays bounded
+MAX_UNIT_CHARS = 20_000
+
+
+def iter_files(paths):
+    # Yields every supported file under the given files and directories, in a stable order
+    for path in paths:
+        if os.path.isfile(path):
+            if os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.abspath(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(root, name))
+
+
+def iter_text(path):
+    # Paragraphs separated by blank lines, read line by line
+    lines, size, paragraph = [], 0, 1
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip():
+                lines.append(line.rstrip("\n"))
+                size += len(line)
+                if size < MAX_UNIT_CHARS:
+                    continue
+            if lines:
+                yield f"paragraph {paragraph}", "\n".join(lines)
+                lines, size, paragraph = [], 0, paragraph + 1
+    if lines:
+        yield f"paragraph {paragraph}", "\n".join(lines)
+
+
+def iter_csv(path):
+    # One unit per row, as "column: value" pairs
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        for number, row in enumerate(csv.DictReader(f), start=1):
+            text = "; ".join(f"{key}: {value}" for key, value in row.items() if value)
+            if text:
+                yield f"row {number}", text
+
+
+def iter_pdf(path):
+    # One unit per page; pages are parsed lazily
+    from pypdf import PdfReader
+
+    for number, page in enumerate(PdfReader(path).pages, start=1):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield f"page {number}", text
+
+
+def iter_units(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return iter_csv(path)
+    if extension == ".pdf":
+        return iter_pdf(path)
+    return iter_text(path)
+
+
+def split_text(text, chunk_size=1000, chunk_overlap=100):
+    # Splits on whitespace into chunks of at most chunk_size characters (unless a
+    # single word is longer), repeating about chunk_overlap characters between chunks
+    words = text.split()
+    start = 0
+    while start < len(words):
+        end, length = start, 0
+        while end < len(words) and (end == start or length + 1 + len(words[end]) <= chunk_size):
+            length += len(words[end]) + (end > start)
+            end += 1
+        yield " ".join(words[start:end])
+        if end == len(words):
+            break
+        overlap, back = 0, end
+        while back > start + 1 and overlap + len(words[back - 1]) + 1 <= chunk_overlap:
+            back -= 1
+            overlap += len(words[back]) + 1
+        start = back
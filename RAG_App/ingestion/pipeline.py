@@ -0,0 +1,321 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from langchain_community.vectorstores import FAISS
+
+from ingestion.loaders import iter_files, iter_units, split_text
+from retriever import ann
+from retriever.bm25 import BM25Index
+from retriever.docstore import SQLiteDocstore, docstore_path
+from retriever.vector_store import EMBEDDING_MODEL, INDEX_DIR, RAG_DIR, get_embeddings, index_lock, load_index, load_lexical, read_meta, save_index
+
+log = logging.getLogger(__name__)
+
+# Which chunks of which files are in the index, so re-runs only touch what changed
+MANIFEST_PATH = os.getenv("RAG_MANIFEST_PATH", os.path.join(RAG_DIR, "data", "manifest.db"))
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+BATCH_SIZE = 64
+WORKERS = min(4, os.cpu_count() or 1)
+# The index and manifest are saved together after roughly this many new
+# chunks, or once the new chunks reach CHECKPOINT_GROWTH times the index,
+# whichever is more. Every save writes the whole index, so a fixed interval
+# would make a large ingestion quadratic; a growing one keeps it linear
+CHECKPOINT_EVERY = 10_000
+CHECKPOINT_GROWTH = 0.5
+
+
+def chunk_id(source, text, occurrence=0):
+    # Content-addressed: an unchanged chunk keeps its id wherever it moves in the file
+    return hashlib.sha256(f"{source}\0{occurrence}\0{text}".encode()).hexdigest()
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    # Occurrences of each chunk text so far, by digest so a large file costs
+    # 20 bytes per chunk rather than the chunk itself
+    seen = {}
+    for location, unit in iter_units(source):
+        for text in split_text(unit, chunk_size, chunk_overlap):
+            digest = hashlib.sha1(text.encode()).digest()
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            yield chunk_id(source, text, occurrence), text, {"source": source, "location": location}
+
+
+def _embed(texts):
+    return get_embeddings().embed_documents(texts)
+
+
+def _under(source, roots):
+    return any(source == root or source.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+
+
+class Manifest:
+    def __init__(self, path=MANIFEST_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER);
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, source TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+
+    def get(self, key):
+        row = self.db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row and row[0]
+
+    def set(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, str(value)))
+
+    def clear(self):
+        self.db.execute("DELETE FROM sources")
+        self.db.execute("DELETE FROM chunks")
+
+    def invalidate(self, sources=None):
+        # Forces the given sources (all by default) to be read again on the next run
+        if sources is None:
+            self.db.execute("UPDATE sources SET mtime_ns = -1")
+        else:
+            self.db.executemany("UPDATE sources SET mtime_ns = -1 WHERE source = ?", ((source,) for source in sources))
+
+    def stat(self, source):
+        return self.db.execute("SELECT mtime_ns, size FROM sources WHERE source = ?", (source,)).fetchone()
+
+    def sources(self):
+        return [row[0] for row in self.db.execute("SELECT source FROM sources")]
+
+    def chunk_ids(self, source=None):
+        if source is None:
+            return {row[0] for row in self.db.execute("SELECT chunk_id FROM chunks")}
+        return {row[0] for row in self.db.execute("SELECT chunk_id FROM chunks WHERE source = ?", (source,))}
+
+    def update(self, source, mtime_ns, size, ids):
+        self.db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+        self.db.executemany("INSERT INTO chunks VALUES (?, ?)", ((chunk, source) for chunk in ids))
+        self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (source, mtime_ns, size))
+
+    def remove(self, source):
+        self.db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+        self.db.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class Ingestion:
+    """
+    Syncs the FAISS index with a set of files and directories.
+
+    Files are streamed unit by unit (page, row, paragraph) and chunked, and only
+    chunks the manifest doesn't have yet are embedded, in batches on a worker
+    pool with a bounded number of batches in flight, so memory stays flat
+    however large the corpus is. Chunks of changed or deleted files that are no
+    longer present are removed from the index. Unchanged files (same size and
+    mtime) are not read at all.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, batch_size=BATCH_SIZE, workers=WORKERS,
+                 processes=False, index_dir=INDEX_DIR, manifest_path=MANIFEST_PATH):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.processes = processes
+        self.index_dir = index_dir
+        self.manifest = Manifest(manifest_path)
+        # Chunk texts live on disk, not in the FAISS wrapper's memory
+        self.docstore = SQLiteDocstore(docstore_path(index_dir))
+        self.vectorstore = None
+        self.lexical = BM25Index()
+        self.pending = deque()
+        self.stale = set()
+        self.stats = {"files": 0, "skipped": 0, "added": 0, "deleted": 0}
+        self.since_checkpoint = 0
+        self.changed = False
+
+    def _open(self, rebuild):
+        meta = read_meta(self.index_dir)
+        settings = f"{self.chunk_size}:{self.chunk_overlap}"
+        if not rebuild and meta is not None and meta.get("model") == EMBEDDING_MODEL and self.manifest.get("model") == EMBEDDING_MODEL:
+            self.vectorstore = load_index(self.index_dir)
+        if self.vectorstore is None:
+            # No usable index: everything gets embedded again, and chunks
+            # that don't come back are dropped from the docstore
+            self.manifest.clear()
+            self.manifest.set("model", EMBEDDING_MODEL)
+            self.docstore.delete(self.docstore.ids())
+            self.changed = True
+            return
+        if not isinstance(self.vectorstore.docstore, SQLiteDocstore):
+            # Indexes saved with their texts in memory move them to the docstore
+            self.docstore.add({chunk: self.vectorstore.docstore.search(chunk) for chunk in self.vectorstore.index_to_docstore_id.values()})
+            self.changed = True
+        self.vectorstore.docstore = self.docstore
+        # Indexes saved before BM25 existed get one built from their chunks
+        self.lexical = load_lexical(self.index_dir) or BM25Index.from_docstore(self.vectorstore)
+        if self.manifest.get("settings") != settings:
+            # New chunking: re-read every file, identical chunks keep their vectors
+            self.manifest.invalidate()
+        if str(meta.get("checkpoint")) != self.manifest.get("checkpoint"):
+            self._reconcile()
+
+    def _reconcile(self):
+        # An interrupted run saved the index but not the manifest: drop vectors
+        # the manifest doesn't know and re-read files whose chunks are missing
+        indexed = set(self.vectorstore.index_to_docstore_id.values())
+        known = self.manifest.chunk_ids()
+        orphans = indexed - known
+        if orphans:
+            self.manifest.invalidate({self.vectorstore.docstore.search(chunk).metadata["source"] for chunk in orphans})
+            self.vectorstore = ann.remove(self.vectorstore, orphans)
+            self.lexical.remove(orphans)
+        missing = known - indexed
+        if missing:
+            missing_ids = (json.dumps(list(missing)),)
+            sources = [row[0] for row in self.manifest.db.execute(
+                "SELECT DISTINCT source FROM chunks WHERE chunk_id IN (SELECT value FROM json_each(?))", missing_ids)]
+            self.manifest.db.execute("DELETE FROM chunks WHERE chunk_id IN (SELECT value FROM json_each(?))", missing_ids)
+            self.manifest.invalidate(sources)
+        self.changed = True
+        log.info("Reconciled index with manifest: %d orphaned, %d missing chunks", len(orphans), len(missing))
+
+    def _submit(self, executor, batch):
+        ids, texts, metadatas = zip(*batch)
+        self.pending.append((executor.submit(_embed, list(texts)), ids, texts, metadatas))
+        if len(self.pending) >= 2 * self.workers:
+            self._drain(1)
+
+    def _drain(self, limit=None):
+        while self.pending and (limit is None or limit > 0):
+            future, ids, texts, metadatas = self.pending.popleft()
+            pairs = list(zip(texts, future.result()))
+            if self.vectorstore is None:
+                self.vectorstore = FAISS.from_embeddings(
+                    pairs, get_embeddings(), metadatas=list(metadatas), ids=list(ids), docstore=self.docstore
+                )
+            else:
+                self.vectorstore.add_embeddings(pairs, metadatas=list(metadatas), ids=list(ids))
+            for chunk, text in zip(ids, texts):
+                self.lexical.add(chunk, text)
+            self.stats["added"] += len(ids)
+            self.since_checkpoint += len(ids)
+            if limit is not None:
+                limit -= 1
+
+    def _checkpoint_interval(self):
+        indexed = self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+        return max(CHECKPOINT_EVERY, CHECKPOINT_GROWTH * indexed)
+
+    def _checkpoint(self):
+        self._drain()
+        if self.vectorstore is not None:
+            stale = self.stale & set(self.vectorstore.index_to_docstore_id.values())
+            if ann.needs_rebuild(self.vectorstore.index):
+                # The corpus outgrew its index type (or IVF lists): move to the one that fits now
+                self.vectorstore = ann.rebuild(self.vectorstore, drop=stale)
+                log.info("Rebuilt index as %s for %d vectors", type(self.vectorstore.index).__name__, self.vectorstore.index.ntotal)
+            elif stale:
+                self.vectorstore = ann.remove(self.vectorstore, stale)
+            self.lexical.remove(stale)
+            self.stats["deleted"] += len(stale)
+        self.stale = set()
+        checkpoint = int(self.manifest.get("checkpoint") or 0) + 1
+        if self.vectorstore is not None:
+            save_index(self.vectorstore, self.index_dir, self.lexical, checkpoint=checkpoint, chunks=self.manifest.count())
+            self.docstore.commit(checkpoint)
+        self.manifest.set("checkpoint", checkpoint)
+        self.manifest.set("settings", f"{self.chunk_size}:{self.chunk_overlap}")
+        self.manifest.commit()
+        self.since_checkpoint = 0
+        log.info("Checkpoint %d: %s", checkpoint, self.stats)
+
+    def _sync_file(self, executor, source):
+        info = os.stat(source)
+        self.stats["files"] += 1
+        if self.manifest.stat(source) == (info.st_mtime_ns, info.st_size):
+            self.stats["skipped"] += 1
+            return
+        existing = self.manifest.chunk_ids(source)
+        current = set()
+        batch = []
+        try:
+            for chunk, text, metadata in iter_chunks(source, self.chunk_size, self.chunk_overlap):
+                current.add(chunk)
+                if chunk in existing:
+                    continue
+                batch.append((chunk, text, metadata))
+                if len(batch) == self.batch_size:
+                    self._submit(executor, batch)
+                    batch = []
+        except Exception:
+            # Drop whatever was queued for a file that failed halfway; it is retried next run
+            self.stale |= current - existing
+            raise
+        if batch:
+            self._submit(executor, batch)
+        self.stale |= existing - current
+        self.manifest.update(source, info.st_mtime_ns, info.st_size, current)
+        self.changed = True
+
+    def run(self, paths, rebuild=False, wait=True):
+        """
+        Syncs the index with paths and returns the run's stats. Runs on the
+        same index take turns; with wait=False, returns None at once if
+        another one is in progress.
+        """
+        with index_lock(self.index_dir, blocking=wait) as locked:
+            if not locked:
+                self.manifest.close()
+                return None
+            return self._run(paths, rebuild)
+
+    def _run(self, paths, rebuild):
+        started = time.perf_counter()
+        roots = [os.path.abspath(path) for path in paths]
+        self._open(rebuild)
+        if self.processes:
+            executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            executor = ThreadPoolExecutor(self.workers)
+        with executor:
+            seen = set()
+            for source in iter_files(roots):
+                seen.add(source)
+                try:
+                    self._sync_file(executor, source)
+                except Exception as e:  # one unreadable file shouldn't stop the run
+                    log.warning("Skipping %s: %s", source, e)
+                    continue
+                if self.since_checkpoint + len(self.pending) * self.batch_size >= self._checkpoint_interval():
+                    self._checkpoint()
+            for source in self.manifest.sources():
+                if source not in seen and _under(source, roots):
+                    self.stale |= self.manifest.chunk_ids(source)
+                    self.manifest.remove(source)
+                    self.changed = True
+            self._drain()
+        if self.changed or self.stale:
+            self._checkpoint()
+        self.manifest.close()
+        self.stats["seconds"] = round(time.perf_counter() - started, 2)
+        return self.stats
+
+
+def ingest(paths, rebuild=False, wait=True, **options):
+    return Ingestion(**options).run(paths, rebuild=rebuild, wait=wait)
@@ -1,6 +1,11 @@
+import logging
+
 import streamlit as st
 from app.chat import run_chat
 
+# Per-turn timings are logged by chains.rag_chain
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 st.set_page_config(page_title="RAG Chatbot", layout="centered")
 st.title("🎯 RAG Activity Recommendation Chatbot")
 
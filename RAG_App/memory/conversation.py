@@ -1,8 +1,126 @@
-from langchain.memory import ConversationBufferMemory
-
-def get_memory():
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True
-    )
-    return memory
\ No newline at end of file
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+MEMORY_DB_PATH = os.getenv(
+    "RAG_MEMORY_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "memory.db")
+)
+# Tokens of recent messages passed to the chain verbatim; older ones are folded into the summary
+HISTORY_TOKEN_BUDGET = int(os.getenv("RAG_HISTORY_TOKEN_BUDGET", "1000"))
+# A question or answer folded out of the window leaves one line in the
+# summary, cut to SUMMARY_LINE_CHARS; only the newest SUMMARY_MAX_LINES are kept,
+# so the summary can't outgrow the window it stands in for
+SUMMARY_LINE_CHARS = 160
+SUMMARY_MAX_LINES = 20
+ROLES = {"human": HumanMessage, "ai": AIMessage}
+
+
+def approx_tokens(text):
+    # Stored with each row when a turn is appended, so fitting a session to the
+    # budget is a sum over integers; len/4 plus the role prefix is close enough
+    return len(text) // 4 + 4
+
+
+class ConversationStore:
+    """
+    Chat sessions in SQLite. Each session keeps its messages and a running
+    summary of the ones that no longer fit the token budget; only messages
+    newer than the summary are ever read back, so loading a session costs
+    the same however long the conversation has been.
+    """
+
+    def __init__(self, path=MEMORY_DB_PATH, budget=HISTORY_TOKEN_BUDGET):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_through INTEGER NOT NULL DEFAULT 0
+            );
+            """
+        )
+
+    def _session(self, session_id):
+        row = self.db.execute("SELECT summary, summarized_through FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row or ("", 0)
+
+    def _window(self, session_id, through):
+        # Messages not folded into the summary yet; append() keeps them within the budget
+        return self.db.execute(
+            "SELECT id, role, content, tokens FROM messages WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, through),
+        ).fetchall()
+
+    def load(self, session_id):
+        # Returns (summary, [(role, content), ...]) for the session
+        with self._lock:
+            summary, through = self._session(session_id)
+            return summary, [(role, content) for _, role, content, _ in self._window(session_id, through)]
+
+    def append(self, session_id, question, answer):
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT INTO messages (session_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                [(session_id, role, text, approx_tokens(text)) for role, text in (("human", question), ("ai", answer))],
+            )
+            summary, through = self._session(session_id)
+            window = self._window(session_id, through)
+            used = sum(row[3] for row in window)
+            folded = []
+            while window and used > self.budget:
+                row = window.pop(0)
+                used -= row[3]
+                folded.append(row)
+            if folded:
+                lines = summary.splitlines() if summary else []
+                lines += [f"- {role}: {content[:SUMMARY_LINE_CHARS]}" for _, role, content, _ in folded]
+                self.db.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                    (session_id, "\n".join(lines[-SUMMARY_MAX_LINES:]), folded[-1][0]),
+                )
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return ConversationStore()
+
+
+class SessionMemory:
+    def __init__(self, session_id, store=None):
+        self.session_id = session_id
+        self.store = store or get_store()
+
+    def messages(self):
+        # Chat history for the chain: the summary, then the recent window
+        summary, window = self.store.load(self.session_id)
+        history = [ROLES[role](content=content) for role, content in window]
+        if summary:
+            history.insert(0, SystemMessage(content=f"Summary of earlier conversation:\n{summary}"))
+        return history
+
+    def turns(self):
+        # Recent (role, content) pairs, for redisplaying a resumed session
+        return self.store.load(self.session_id)[1]
+
+    def save(self, question, answer):
+        self.store.append(self.session_id, question, answer)
+
+
+def get_memory(session_id):
+    return SessionMemory(session_id)
@@ -0,0 +1,151 @@
+import math
+import os
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# "auto" picks one of INDEX_TYPES from the corpus size and the memory budget
+INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "auto")
+INDEX_MEMORY_MB = int(os.getenv("RAG_INDEX_MEMORY_MB", "2048"))
+# Exact search is fast enough below this many vectors
+FLAT_MAX_VECTORS = 50_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+# Inverted lists probed per query, as a fraction of all lists
+IVF_PROBE_FRACTION = float(os.getenv("RAG_IVF_PROBE_FRACTION", "0.03"))
+PQ_BITS = 8
+REBUILD_BATCH = 100_000
+
+
+def ivf_lists(n_vectors):
+    # ~4 * sqrt(n) lists, with enough training points per list
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def pq_subquantizers(dim):
+    # Sub-vectors of at least 8 dimensions, one byte each
+    return next(m for m in (64, 48, 32, 24, 16, 8, 4, 2, 1) if dim % m == 0 and dim // m >= 8 or m == 1)
+
+
+def training_size(index_type, n_vectors):
+    if index_type not in ("ivf_flat", "ivf_pq"):
+        return 0
+    needed = 64 * ivf_lists(n_vectors)
+    if index_type == "ivf_pq":
+        needed = max(needed, 64 * 2 ** PQ_BITS)
+    return min(n_vectors, needed)
+
+
+def index_memory(index_type, n_vectors, dim):
+    # Rough resident size in bytes
+    if index_type == "flat":
+        return n_vectors * dim * 4
+    if index_type == "hnsw":
+        return n_vectors * (dim * 4 + HNSW_M * 2 * 4 * 1.1)
+    if index_type == "ivf_flat":
+        return n_vectors * (dim * 4 + 8) + ivf_lists(n_vectors) * dim * 4
+    return n_vectors * (pq_subquantizers(dim) + 8) + ivf_lists(n_vectors) * dim * 4
+
+
+def choose_index_type(n_vectors, dim, memory_mb=INDEX_MEMORY_MB):
+    if n_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    for index_type in ("hnsw", "ivf_flat"):
+        if index_memory(index_type, n_vectors, dim) <= memory_mb * 2 ** 20:
+            return index_type
+    return "ivf_pq"
+
+
+def index_type_of(index):
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def build_index(index_type, dim, n_vectors, sample=None):
+    """
+    Empty index of the given type for about n_vectors vectors, trained on
+    sample (training_size() rows drawn from the corpus) where it needs it.
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return configure(index)
+    nlist = ivf_lists(n_vectors)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), PQ_BITS)
+    index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    return configure(index)
+
+
+def configure(index):
+    # Search-time settings aren't tied to the saved index, so apply them after every load
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = max(1, min(index.nlist, round(index.nlist * IVF_PROBE_FRACTION)))
+    return index
+
+
+def wanted_index_type(n_vectors, dim):
+    return choose_index_type(n_vectors, dim) if INDEX_TYPE == "auto" else INDEX_TYPE
+
+
+def needs_rebuild(index):
+    index_type = index_type_of(index)
+    if index_type != wanted_index_type(index.ntotal, index.d):
+        return True
+    # IVF lists were sized for a much smaller corpus
+    return isinstance(index, faiss.IndexIVF) and ivf_lists(index.ntotal) >= 2 * index.nlist
+
+
+def rebuild(vectorstore, index_type=None, drop=()):
+    """
+    Copies the vectorstore into a new index of index_type (the wanted type by
+    default), without the docstore ids in drop. Vectors come back from the
+    embedding cache, so nothing is re-embedded and lossy indexes don't lose
+    precision over rebuilds.
+    """
+    drop = set(drop)
+    ids = [chunk for _, chunk in sorted(vectorstore.index_to_docstore_id.items()) if chunk not in drop]
+    dim = vectorstore.index.d
+    index_type = index_type or wanted_index_type(len(ids), dim)
+    embeddings = vectorstore.embedding_function
+
+    def vectors(chunk_ids):
+        texts = [vectorstore.docstore.search(chunk).page_content for chunk in chunk_ids]
+        return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+    sample = None
+    if training_size(index_type, len(ids)):
+        picked = np.random.default_rng(0).choice(len(ids), training_size(index_type, len(ids)), replace=False)
+        sample = vectors([ids[position] for position in sorted(picked)])
+    index = build_index(index_type, dim, len(ids), sample)
+    for start in range(0, len(ids), REBUILD_BATCH):
+        index.add(vectors(ids[start:start + REBUILD_BATCH]))
+    # The docstore is kept, minus the dropped chunks
+    dropped = [chunk for chunk in vectorstore.index_to_docstore_id.values() if chunk in drop]
+    if dropped:
+        vectorstore.docstore.delete(dropped)
+    return FAISS(embeddings, index, vectorstore.docstore, dict(enumerate(ids)))
+
+
+def remove(vectorstore, ids):
+    # Only flat indexes renumber vectors on removal the way the LangChain
+    # wrapper expects; the others are rebuilt without the removed ids
+    if index_type_of(vectorstore.index) == "flat":
+        vectorstore.delete(list(ids))
+        return vectorstore
+    return rebuild(vectorstore, index_type_of(vectorstore.index), drop=ids)
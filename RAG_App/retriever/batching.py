@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_MS = float(os.getenv("RAG_EMBED_BATCH_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    Groups concurrent submit() calls into one call of a blocking batch
+    function, run on a worker thread.
+
+    A batch is flushed when max_batch items are waiting or window_ms after
+    the first one arrived. Only one batch runs at a time; items arriving
+    meanwhile form the next batch, so under load batches grow on their own.
+    """
+
+    def __init__(self, fn, max_batch=EMBED_BATCH_SIZE, window_ms=EMBED_BATCH_MS):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.stats = {"batches": 0, "items": 0}
+        self._pending = []
+        self._timer = None
+        self._running = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._running is None and self._pending:
+            self._running = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                self.stats["batches"] += 1
+                self.stats["items"] += len(batch)
+                try:
+                    results = await loop.run_in_executor(None, self.fn, [item for item, _ in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._running = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -0,0 +1,171 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from have i in is it me my of on or so some the this to want was what"
+    " with would you your".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalHit(NamedTuple):
+    chunk_id: str
+    score: float
+    # Share of the query's idf weight matched by the chunk, 0..1
+    coverage: float
+
+
+class BM25Index:
+    """
+    Compact BM25 inverted index over the chunks in the FAISS index.
+
+    Postings are stored CSR-style: for term t, docs[offsets[t]:offsets[t + 1]]
+    are chunk positions and tfs the term counts there. Additions and removals
+    are buffered and merged into the arrays by compact(), which never
+    re-tokenizes chunks already indexed. Saved as .npy files that load
+    memory-mapped.
+    """
+
+    def __init__(self, ids=(), vocab=(), offsets=None, docs=None, tfs=None, lengths=None):
+        self.ids = list(ids)
+        self.positions = {chunk: position for position, chunk in enumerate(self.ids)}
+        self.vocab = list(vocab)
+        self.terms = {term: index for index, term in enumerate(self.vocab)}
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+        self.docs = np.empty(0, dtype=np.int32) if docs is None else docs
+        self.tfs = np.empty(0, dtype=np.uint16) if tfs is None else tfs
+        self.lengths = np.empty(0, dtype=np.int32) if lengths is None else lengths
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self._added = ([], [], [], [])  # term ids, positions, counts, chunk lengths
+
+    def __len__(self):
+        return int(self.alive.sum()) + len(self._added[3])
+
+    @property
+    def dirty(self):
+        return bool(self._added[3]) or not self.alive.all()
+
+    def add(self, chunk_id, text):
+        if chunk_id in self.positions:
+            return
+        terms, positions, counts, lengths = self._added
+        position = len(self.ids)
+        self.ids.append(chunk_id)
+        self.positions[chunk_id] = position
+        tokens = tokenize(text)
+        for term, count in Counter(tokens).items():
+            if term not in self.terms:
+                self.terms[term] = len(self.vocab)
+                self.vocab.append(term)
+            terms.append(self.terms[term])
+            positions.append(position)
+            counts.append(min(count, 65535))
+        lengths.append(len(tokens))
+
+    def remove(self, chunk_ids):
+        for chunk in chunk_ids:
+            position = self.positions.pop(chunk, None)
+            if position is not None and position < len(self.alive):
+                self.alive[position] = False
+            elif position is not None:
+                # Added since the last compact: a negative length drops it when merging
+                self._added[3][position - len(self.alive)] = -1
+
+    def compact(self):
+        if not self.dirty:
+            return
+        added_terms, added_positions, added_counts, added_lengths = self._added
+        lengths = np.concatenate([self.lengths, np.asarray(added_lengths, dtype=np.int32)])
+        alive = np.concatenate([self.alive, lengths[len(self.alive):] >= 0])
+        terms = np.concatenate([np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets)), np.asarray(added_terms, dtype=np.int64)])
+        docs = np.concatenate([self.docs, np.asarray(added_positions, dtype=np.int32)])
+        tfs = np.concatenate([self.tfs, np.asarray(added_counts, dtype=np.uint16)])
+
+        keep = alive[docs]
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+        # Stable: within a term, positions stay ascending
+        order = np.argsort(terms, kind="stable")
+        counts = np.bincount(terms, minlength=len(self.vocab))
+        used = counts > 0
+        self.vocab = [term for term, kept in zip(self.vocab, used) if kept]
+        self.terms = {term: index for index, term in enumerate(self.vocab)}
+        self.offsets = np.concatenate([[0], np.cumsum(counts[used])]).astype(np.int64)
+        self.docs = (np.cumsum(alive) - 1)[docs[order]].astype(np.int32)
+        self.tfs = tfs[order]
+        self.ids = [chunk for chunk, kept in zip(self.ids, alive) if kept]
+        self.positions = {chunk: position for position, chunk in enumerate(self.ids)}
+        self.lengths = lengths[alive]
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self._added = ([], [], [], [])
+
+    def search(self, query, k=4):
+        self.compact()
+        tokens = set(tokenize(query))
+        n_docs = len(self.ids)
+        if not tokens or not n_docs:
+            return []
+        average_length = max(float(self.lengths.mean()), 1.0)
+        query_weight, postings, scores, weights = 0.0, [], [], []
+        for token in tokens:
+            index = self.terms.get(token)
+            frequency = 0 if index is None else int(self.offsets[index + 1] - self.offsets[index])
+            idf = math.log(1 + (n_docs - frequency + 0.5) / (frequency + 0.5))
+            query_weight += idf
+            if not frequency:
+                continue
+            docs = self.docs[self.offsets[index]:self.offsets[index + 1]]
+            tfs = self.tfs[self.offsets[index]:self.offsets[index + 1]].astype(np.float32)
+            norm = K1 * (1 - B + B * self.lengths[docs] / average_length)
+            postings.append(docs)
+            scores.append(idf * tfs * (K1 + 1) / (tfs + norm))
+            weights.append(np.full(len(docs), idf))
+        if not postings:
+            return []
+        docs, inverse = np.unique(np.concatenate(postings), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        matched = np.bincount(inverse, weights=np.concatenate(weights))
+        top = np.argpartition(-totals, k - 1)[:k] if len(totals) > k else np.arange(len(totals))
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return [LexicalHit(self.ids[docs[i]], float(totals[i]), float(matched[i] / query_weight)) for i in top]
+
+    def save(self, path):
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+        for name in ("offsets", "docs", "tfs", "lengths"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        # Tokens are \w+ and ids are hex, so newlines can separate them
+        with open(os.path.join(path, "vocab.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(self.vocab))
+        with open(os.path.join(path, "ids.txt"), "w") as f:
+            f.write("\n".join(self.ids))
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(os.path.join(path, "ids.txt")):
+            return None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ("offsets", "docs", "tfs", "lengths")}
+        with open(os.path.join(path, "vocab.txt"), encoding="utf-8") as f:
+            text = f.read()
+        vocab = text.split("\n") if text else []
+        with open(os.path.join(path, "ids.txt")) as f:
+            ids = f.read().split()
+        return cls(ids, vocab, **arrays)
+
+    @classmethod
+    def from_docstore(cls, vectorstore):
+        index = cls()
+        for _, chunk in sorted(vectorstore.index_to_docstore_id.items()):
+            index.add(chunk, vectorstore.docstore.search(chunk).page_content)
+        index.compact()
+        return index
@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import threading
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+
+def docstore_path(index_dir):
+    return f"{os.path.abspath(index_dir)}.chunks.db"
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Chunk texts and metadata for a FAISS index, kept in SQLite so that only
+    vectors and ids stay in memory however large the corpus grows.
+
+    One database serves every saved version of an index. Deleted chunks stay
+    readable until the version after next is committed, because the previous
+    version is kept on disk for readers still loading it. Pickles as its path,
+    which is all FAISS.save_local writes for it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._deleted = set()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS deleted (chunk_id TEXT PRIMARY KEY, checkpoint INTEGER NOT NULL);
+            """
+        )
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def search(self, search):
+        with self._lock:
+            row = self.db.execute("SELECT text, metadata FROM chunks WHERE chunk_id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def ids(self):
+        with self._lock:
+            return [row[0] for row in self.db.execute("SELECT chunk_id FROM chunks")]
+
+    def add(self, texts):
+        ids = list(texts)
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                ((chunk, document.page_content, json.dumps(document.metadata)) for chunk, document in texts.items()),
+            )
+            # Back in the index: no longer due for removal
+            self.db.executemany("DELETE FROM deleted WHERE chunk_id = ?", ((chunk,) for chunk in ids))
+            self._deleted.difference_update(ids)
+
+    def delete(self, ids):
+        # Recorded only; the rows go once no saved version refers to them
+        with self._lock:
+            self._deleted.update(ids)
+
+    def commit(self, checkpoint):
+        """
+        Called once the index version saved at checkpoint is live. Rows
+        deleted before the previous checkpoint are no longer referenced by
+        either version on disk and are removed.
+        """
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR IGNORE INTO deleted VALUES (?, ?)", ((chunk, checkpoint) for chunk in self._deleted))
+            self.db.execute("DELETE FROM chunks WHERE chunk_id IN (SELECT chunk_id FROM deleted WHERE checkpoint < ?)", (checkpoint,))
+            self.db.execute("DELETE FROM deleted WHERE checkpoint < ?", (checkpoint,))
+            self._deleted = set()
@@ -0,0 +1,189 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from retriever.batching import MicroBatcher
+
+KEY_BYTES = 32
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+
+
+def content_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{text}".encode()).digest()
+
+
+class VectorStore:
+    """
+    Append-only embedding store for one model, in a directory holding:
+
+    * vectors.bin: raw rows of ``dim`` float32 or float16 values, memory-mapped read-only
+    * keys.bin: the 32-byte content key of each row, in row order
+    * meta.json: model, dimension and dtype
+
+    The key -> row offset index is rebuilt from keys.bin when the store opens;
+    vectors are never copied into memory. Writers append under a file lock,
+    so several processes can share one store, and each reader picks up rows
+    appended by others on its next miss.
+    """
+
+    def __init__(self, path, model_name, dtype="float32"):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.offsets = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["model"] == model_name and meta["dtype"] == self.dtype.name:
+                self.dim = meta["dim"]
+            else:
+                self._reset()
+        self._catch_up()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _reset(self):
+        for name in ("vectors.bin", "keys.bin", "meta.json"):
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+
+    def _catch_up(self):
+        # Reads keys appended since the last call and maps the matching rows
+        if self.dim is None or not os.path.exists(self._file("keys.bin")):
+            return
+        row_bytes = self.dim * self.dtype.itemsize
+        rows = min(os.path.getsize(self._file("keys.bin")) // KEY_BYTES, os.path.getsize(self._file("vectors.bin")) // row_bytes)
+        if rows == len(self.offsets):
+            return
+        with open(self._file("keys.bin"), "rb") as f:
+            f.seek(len(self.offsets) * KEY_BYTES)
+            data = f.read((rows - len(self.offsets)) * KEY_BYTES)
+        for start in range(0, len(data), KEY_BYTES):
+            self.offsets.setdefault(data[start:start + KEY_BYTES], len(self.offsets))
+        self._vectors = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+
+    def get(self, keys):
+        # Returns a list with one vector (or None) per key
+        with self._lock:
+            if any(key not in self.offsets for key in keys):
+                self._catch_up()
+            return [None if key not in self.offsets else self._vectors[self.offsets[key]] for key in keys]
+
+    def put(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        with self._lock, open(self._file("lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._file("meta.json"), "w") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name}, f)
+            self._catch_up()
+            # Rows written by a writer that died before adding their keys are dropped
+            row_bytes = self.dim * self.dtype.itemsize
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.truncate(len(self.offsets) * row_bytes)
+            new = [index for index, key in enumerate(keys) if key not in self.offsets]
+            new = list({keys[index]: index for index in new}.values())
+            if not new:
+                return
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.write(vectors[new].tobytes())
+            with open(self._file("keys.bin"), "ab") as f:
+                f.write(b"".join(keys[index] for index in new))
+            self._catch_up()
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that only run the model for text it has never seen.
+
+    Documents are looked up by model name and content hash in a memory-mapped
+    VectorStore. Queries only go through a bounded in-process LRU, so the
+    append-only store holds corpus chunks alone. ``stats`` counts hits and
+    misses of each layer. Async queries that miss
+    the LRU are micro-batched into one forward pass of the model.
+    """
+
+    def __init__(self, load_embeddings, model_name, path, dtype="float32", query_cache_size=QUERY_CACHE_SIZE):
+        # The model is loaded on the first miss, so fully cached runs never load it
+        self.load_embeddings = load_embeddings
+        self._embeddings = None
+        self.model_name = model_name
+        self.store = VectorStore(path, model_name, dtype)
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"query_hits": 0, "store_hits": 0, "misses": 0}
+        self.batcher = MicroBatcher(self.embed_queries)
+
+    @property
+    def embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = self.load_embeddings()
+            return self._embeddings
+
+    def embed_documents(self, texts):
+        keys = [content_key(self.model_name, text) for text in texts]
+        found = self.store.get(keys)
+        missing = [index for index, vector in enumerate(found) if vector is None]
+        with self._lock:
+            self.stats["store_hits"] += len(texts) - len(missing)
+            self.stats["misses"] += len(missing)
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[index] for index in missing])
+            self.store.put([keys[index] for index in missing], vectors)
+            for index, vector in zip(missing, vectors):
+                found[index] = vector
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in found]
+
+    def _cached_query(self, text):
+        with self._lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                self.stats["query_hits"] += 1
+            return vector
+
+    def peek_query(self, text):
+        # The vector of a recently embedded query, or None; never runs the model
+        with self._lock:
+            return self._queries.get(text)
+
+    def embed_queries(self, texts):
+        # Queries are one-off text, so they stay in the bounded LRU and are never
+        # appended to the store. Sentence-transformer models embed queries and
+        # documents the same way, so misses share one embed_documents() pass
+        vectors = [np.asarray(vector, dtype=np.float32).tolist() for vector in self.embeddings.embed_documents(list(texts))]
+        with self._lock:
+            self.stats["misses"] += len(texts)
+            for text, vector in zip(texts, vectors):
+                self._queries[text] = vector
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vectors
+
+    def embed_query(self, text):
+        return self._cached_query(text) or self.embed_queries([text])[0]
+
+    async def aembed_query(self, text):
+        return self._cached_query(text) or await self.batcher.submit(text)
+
+    async def aembed_documents(self, texts):
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_documents, texts)
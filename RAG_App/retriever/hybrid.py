@@ -0,0 +1,73 @@
+import os
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retriever.bm25 import tokenize
+
+# "hybrid" fuses dense and BM25 results, "dense" and "lexical" use one of them
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+# Keyword queries this short whose best BM25 match covers this share of their
+# idf weight are answered from BM25 alone, without running the embedder
+FAST_PATH_MAX_TERMS = 4
+FAST_PATH_COVERAGE = float(os.getenv("RAG_LEXICAL_CONFIDENCE", "0.9"))
+# Results fetched from each side before fusion, per result returned
+FETCH_FACTOR = 4
+RRF_K = 60
+
+stats = {"dense": 0, "lexical": 0, "hybrid": 0}
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking):
+            scores[chunk] = scores.get(chunk, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    vectorstore: Any
+    lexical: Any = None
+    k: int = 4
+    mode: str = RETRIEVAL_MODE
+
+    def _document(self, chunk):
+        return self.vectorstore.docstore.search(chunk)
+
+    def _lexical(self, query):
+        # Returns (hits, documents); documents is set when BM25 alone answers the query
+        if self.lexical is None or self.mode == "dense":
+            return [], None
+        hits = self.lexical.search(query, self.k * FETCH_FACTOR)
+        confident = hits and len(set(tokenize(query))) <= FAST_PATH_MAX_TERMS and hits[0].coverage >= FAST_PATH_COVERAGE
+        if self.mode == "lexical" or confident:
+            stats["lexical"] += 1
+            return hits, [self._document(hit.chunk_id) for hit in hits[:self.k]]
+        return hits, None
+
+    def _fuse(self, dense, hits):
+        if self.lexical is None or self.mode == "dense":
+            stats["dense"] += 1
+            return dense[:self.k]
+        stats["hybrid"] += 1
+        fused = reciprocal_rank_fusion([[document.id for document in dense], [hit.chunk_id for hit in hits]])
+        return [self._document(chunk) for chunk in fused[:self.k]]
+
+    def _fetch_k(self):
+        return self.k if self.lexical is None or self.mode == "dense" else self.k * FETCH_FACTOR
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        hits, documents = self._lexical(query)
+        if documents is not None:
+            return documents
+        return self._fuse(self.vectorstore.similarity_search(query, k=self._fetch_k()), hits)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        # The query embedding goes through the embedder's async path, where
+        # concurrent queries are micro-batched
+        hits, documents = self._lexical(query)
+        if documents is not None:
+            return documents
+        return self._fuse(await self.vectorstore.asimilarity_search(query, k=self._fetch_k()), hits)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Exported models, one directory per model and precision
+ONNX_DIR = os.getenv("RAG_ONNX_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "onnx"))
+# int8 dynamic quantization: roughly 2-3x faster on CPU at a cosine agreement of about 0.99
+ONNX_QUANTIZE = os.getenv("RAG_ONNX_QUANTIZE", "1") == "1"
+# Intra-op threads per session; 0 lets ONNX Runtime use one per physical core
+ONNX_THREADS = int(os.getenv("RAG_ONNX_THREADS", "0"))
+ONNX_BATCH_SIZE = int(os.getenv("RAG_ONNX_BATCH_SIZE", "32"))
+# all-MiniLM-L6-v2 was trained on 256 tokens; sentence-transformers truncates there too
+MAX_TOKENS = 256
+
+
+def model_path(model_id, quantize=ONNX_QUANTIZE, root=ONNX_DIR):
+    return os.path.join(root, model_id.replace("/", "--") + ("-int8" if quantize else ""))
+
+
+def export(model_id, quantize=ONNX_QUANTIZE, root=ONNX_DIR):
+    """
+    Returns the directory holding model.onnx and tokenizer.json for
+    ``model_id``, fetching the ONNX export from the Hugging Face Hub (and
+    quantizing its weights to int8) on first use. Only needs onnxruntime,
+    onnx and huggingface_hub, not PyTorch.
+    """
+    path = model_path(model_id, quantize, root)
+    if os.path.exists(os.path.join(path, "model.onnx")):
+        return path
+    from huggingface_hub import hf_hub_download
+
+    os.makedirs(root, exist_ok=True)
+    # Built next to the final directory and moved in place, so concurrent
+    # workers never load a half-written model
+    staging = tempfile.mkdtemp(dir=root)
+    try:
+        model = hf_hub_download(model_id, "onnx/model.onnx")
+        shutil.copy(hf_hub_download(model_id, "tokenizer.json"), os.path.join(staging, "tokenizer.json"))
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(model, os.path.join(staging, "model.onnx"), weight_type=QuantType.QInt8)
+        else:
+            shutil.copy(model, os.path.join(staging, "model.onnx"))
+        try:
+            os.rename(staging, path)
+        except OSError:
+            # Another process finished first
+            if not os.path.exists(os.path.join(path, "model.onnx")):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformer embeddings computed with ONNX Runtime on CPU.
+
+    Runs the same steps as sentence-transformers for all-MiniLM-L6-v2 (mean
+    pooling over the attention mask, then L2 normalization), so vectors match
+    the PyTorch backend up to float rounding, or int8 error when quantized.
+    Texts are tokenized in batches by the Rust tokenizer and sorted by length
+    first, so each batch carries little padding.
+    """
+
+    def __init__(self, model_id, quantize=ONNX_QUANTIZE, threads=ONNX_THREADS, batch_size=ONNX_BATCH_SIZE):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        path = export(model_id, quantize)
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_TOKENS)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(os.path.join(path, "model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        # Each run already uses every intra-op thread, so concurrent callers
+        # take turns rather than oversubscribing the CPU
+        self._lock = threading.Lock()
+
+    def _embed(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": np.array([e.ids for e in encodings], dtype=np.int64), "attention_mask": mask}
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        with self._lock:
+            hidden = self.session.run(None, feed)[0]
+        weights = mask[:, :, None].astype(np.float32)
+        vectors = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
@@ -1,17 +1,171 @@
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.schema import Document
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 
-def get_vectorstore():
-    documents = [
-        "Take a leisurely walk in the park and enjoy the fresh air.",
-        "Visit a local museum and discover something new.",
-        "Attend a live music concert and feel the rhythm.",
-        "Go for a hike and admire the natural scenery.",
-        "Have a picnic with friends and share some laughs.",
-        "Explore a new cuisine by dining at an ethnic restaurant.",
-    ]
-    docs = [Document(page_content=doc) for doc in documents]
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectorstore = FAISS.from_documents(docs, embedding_model)
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from retriever.ann import configure
+from retriever.bm25 import BM25Index
+from retriever.embedding_cache import CachedEmbeddings
+from retriever.hybrid import HybridRetriever
+from retriever.onnx_embeddings import ONNX_QUANTIZE, OnnxEmbeddings
+
+log = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+# "hf" runs the model with sentence-transformers (PyTorch), "onnx" with ONNX Runtime
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "hf")
+# Names the vectors in the embedding cache and the index metadata. Both
+# backends give the same vectors at full precision; int8 ones differ
+# slightly, so switching to them re-embeds the corpus
+EMBEDDING_MODEL = MODEL_NAME + ("-int8" if EMBEDDING_BACKEND == "onnx" and ONNX_QUANTIZE else "")
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Symlink to the current version of the FAISS index; the ingestion pipeline
+# saves each version next to it (index.<version>) and repoints it
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(RAG_DIR, "data", "index"))
+# Vectors of every text embedded so far, per model; float16 halves the size at a small loss of precision
+EMBEDDING_CACHE_DIR = os.getenv("RAG_EMBEDDING_CACHE_DIR", os.path.join(RAG_DIR, "data", "embeddings"))
+EMBEDDING_CACHE_DTYPE = os.getenv("RAG_EMBEDDING_CACHE_DTYPE", "float32")
+CORPUS_DIR = os.getenv("RAG_CORPUS_DIR", os.path.join(RAG_DIR, "corpus"))
+# Sync the corpus directory when the app starts; set to 0 for corpora managed with the ingestion CLI only
+INGEST_ON_START = os.getenv("RAG_INGEST_ON_START", "1") == "1"
+
+_lock = threading.Lock()
+_loaded = None
+_ingested = False
+
+
+def load_model():
+    if EMBEDDING_BACKEND == "onnx":
+        return OnnxEmbeddings("sentence-transformers/" + MODEL_NAME)
+    if EMBEDDING_BACKEND != "hf":
+        raise ValueError(f"unknown embedding backend {EMBEDDING_BACKEND!r}, expected 'hf' or 'onnx'")
+    return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    # Loading the model is the slowest step, so do it once per process, and
+    # only when some text isn't in the embedding cache yet
+    return CachedEmbeddings(
+        load_model,
+        EMBEDDING_MODEL,
+        os.path.join(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL.replace("/", "--")),
+        EMBEDDING_CACHE_DTYPE,
+    )
+
+
+def read_meta(index_dir=INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_index(index_dir=INDEX_DIR):
+    meta = read_meta(index_dir)
+    if meta is None or meta.get("model") != EMBEDDING_MODEL:
+        return None
+    # The pickle is our own file, written by save_index
+    vectorstore = FAISS.load_local(index_dir, get_embeddings(), allow_dangerous_deserialization=True)
+    configure(vectorstore.index)
     return vectorstore
+
+
+def load_lexical(index_dir=INDEX_DIR):
+    return BM25Index.load(os.path.join(index_dir, "bm25"))
+
+
+@contextmanager
+def index_lock(index_dir=INDEX_DIR, blocking=True):
+    """
+    Holds an exclusive lock on index_dir for the duration of an ingestion
+    run, shared with other processes (the app syncing on start, the
+    ingestion CLI). Yields False instead of waiting when blocking is False
+    and another run holds it.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(index_dir)), exist_ok=True)
+    with open(f"{index_dir}.lock", "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _versions(index_dir):
+    parent, name = os.path.split(os.path.abspath(index_dir))
+    prefix = name + "."
+    return [
+        os.path.join(parent, entry) for entry in os.listdir(parent)
+        if entry.startswith(prefix) and entry[len(prefix):].isdigit()
+    ]
+
+
+def save_index(vectorstore, index_dir=INDEX_DIR, lexical=None, **meta):
+    """
+    Saves a new version of the index to its own directory and repoints the
+    index_dir symlink at it with a rename, so readers resolve either the old
+    version or the new one, whole. The previous version is kept for readers
+    still loading it; older ones are removed. Callers hold index_lock.
+    """
+    root = os.path.abspath(index_dir)
+    version = time.time_ns()
+    target = f"{root}.{version}"
+    vectorstore.save_local(target)
+    if lexical is not None:
+        lexical.save(os.path.join(target, "bm25"))
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump({"model": EMBEDDING_MODEL, "version": version, **meta}, f)
+    if os.path.isdir(root) and not os.path.islink(root):
+        # An index saved before versioning becomes the previous version
+        os.replace(root, f"{root}.0")
+    previous = os.path.join(os.path.dirname(root), os.readlink(root)) if os.path.islink(root) else f"{root}.0"
+    link = f"{target}.link"
+    os.symlink(os.path.basename(target), link)
+    os.replace(link, root)
+    for path in _versions(root):
+        if path not in (target, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _current():
+    # One index per process, shared by every chat session and reloaded once the
+    # ingestion CLI has saved a newer version
+    global _loaded, _ingested
+    with _lock:
+        if not _ingested and (INGEST_ON_START or read_meta() is None):
+            from ingestion.pipeline import ingest
+
+            # With an index to serve, don't wait for an ingestion CLI run to finish
+            if ingest([CORPUS_DIR], wait=read_meta() is None) is None:
+                log.info("Another ingestion run holds %s; serving the current index", INDEX_DIR)
+            _ingested = True
+        # Resolved once, so the index, its metadata and BM25 all come from the same version
+        index_dir = os.path.realpath(INDEX_DIR)
+        meta = read_meta(index_dir) or {}
+        if _loaded is None or _loaded["version"] != meta.get("version"):
+            vectorstore = load_index(index_dir)
+            retriever = HybridRetriever(vectorstore=vectorstore, lexical=load_lexical(index_dir)) if vectorstore is not None else None
+            _loaded = {"version": meta.get("version"), "vectorstore": vectorstore, "retriever": retriever}
+        return _loaded
+
+
+def get_vectorstore():
+    return _current()["vectorstore"]
+
+
+def get_retriever():
+    return _current()["retriever"]
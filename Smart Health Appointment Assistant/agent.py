@@ -1,4 +1,5 @@
-from typing import Literal, List, Any
+import threading
+from typing import Literal, List, Any, Optional, Tuple
 from typing_extensions import TypedDict, Annotated
 
 from langchain_core.tools import tool
@@ -7,16 +8,27 @@ from langgraph.graph.message import add_messages
 from langgraph.graph import START, StateGraph, END
 from langgraph.prebuilt import create_react_agent
 from langchain_core.prompts.chat import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.messages import HumanMessage, AIMessage
 
-from prompt_library.prompt import system_prompt
+from prompt_library.prompt import supervisor_prompt
 from utils.llms import LanguageModel
+from utils.router import KeywordRouter
+from utils.instrumentation import logger, node_span, record_routing
+from utils.cache import build_cache, cache_key, normalize_query
+from utils.memory import compact_history, history_fingerprint, history_view
+from toolkit.availability import get_availability_repository
 from toolkit.toolkits import (
     check_availability_by_doctor,
     check_availability_by_specialization,
+    check_availability_range,
+    find_next_available,
     set_appointment,
     cancel_appointment,
-    reschedule_appointment
+    reschedule_appointment,
+    allocate_waitlist,
+    tool_call_scope,
+    with_catalog
 )
 
 
@@ -32,6 +44,7 @@ class AgentContext(TypedDict):
     next: str
     query: str
     current_reasoning: str
+    summary: str
 
 
 # === Main Agent Class ===
@@ -39,37 +52,95 @@ class AgentContext(TypedDict):
 class DoctorAppointmentAgent:
     """
     A multi-agent system to manage doctor availability queries and appointment bookings.
+
+    The worker agents and the compiled graph are built once and shared by all
+    requests; compiled LangGraph graphs keep no per-run state, so concurrent
+    invocations are safe.
+
+    With a checkpointer, each patient's conversation persists across requests
+    under the ``thread_id`` in the run config. Every LLM call sees a
+    token-budgeted view of that history (see ``utils.memory``), and the stored
+    history is compacted at the start of each turn.
     """
 
-    def __init__(self):
+    def __init__(self, pre_router=None, checkpointer=None):
         self.llm = LanguageModel().get_model()
+        self.router = self.llm.with_structured_output(RoutingDecision)
+        # Answers obvious hops without an LLM call; pass False to always ask the LLM
+        self.pre_router = KeywordRouter() if pre_router is None else pre_router
+        # First-hop routing decisions by query and earlier conversation, and
+        # availability answers by those along with the slot versions they read
+        self.routing_cache = build_cache("routing")
+        self.answer_cache = build_cache("answer")
+        self.info_agent = self._build_info_agent()
+        self.booking_agent = self._build_booking_agent()
+        self.checkpointer = checkpointer
+        self.app = None
+        self._graph_lock = threading.Lock()
+
+    def _build_info_agent(self):
+        info_prompt = ChatPromptTemplate.from_messages([
+            ("system", 
+             "You are an assistant that answers FAQs or doctor availability queries. "
+             "Always consider the year to be 2024."),
+            ("placeholder", "{messages}"),
+        ])
 
-    def supervisor_node(self, context: AgentContext) -> Command[Literal["information_node", "booking_node", "__end__"]]:
-        print("🧠 Entered supervisor_node with state:")
-        print(context)
+        return create_react_agent(
+            model=self.llm,
+            tools=with_catalog([
+                check_availability_by_doctor,
+                check_availability_by_specialization,
+                check_availability_range,
+                find_next_available,
+            ]),
+            prompt=info_prompt
+        )
+
+    def _build_booking_agent(self):
+        booking_prompt = ChatPromptTemplate.from_messages([
+            ("system", 
+             "You manage appointments: setting, rescheduling, or canceling, "
+             "and booking whole waitlists at once. "
+             "Always consider the year to be 2024."),
+            ("placeholder", "{messages}"),
+        ])
+
+        return create_react_agent(
+            model=self.llm,
+            tools=with_catalog([set_appointment, cancel_appointment, reschedule_appointment, allocate_waitlist]),
+            prompt=booking_prompt
+        )
+
+    @staticmethod
+    def _turn_query(context: AgentContext) -> str:
+        return context.get("query") or context["messages"][-1].content
+
+    def _view(self, context: AgentContext) -> List[Any]:
+        return history_view(context["messages"], self._turn_query(context), context.get("summary", ""))
+
+    def _routing_request(self, context: AgentContext):
+        logger.debug("🧠 Entered supervisor_node with state: %s", context)
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": supervisor_prompt},
             {"role": "user", "content": f"User's identification number is {context['id_number']}"},
-        ] + context["messages"]
-
-        user_query = context["messages"][0].content if len(context["messages"]) == 1 else ""
+        ] + self._view(context)
 
-        print("📨 Compiled messages:")
-        print(messages)
+        # A new turn starts with ``next`` reset by the caller
+        user_query = self._turn_query(context) if not context.get("next") else ""
 
-        print("❓ Query extracted:")
-        print(user_query)
+        logger.debug("📨 Compiled messages: %s", messages)
+        logger.debug("❓ Query extracted: %s", user_query)
 
-        decision = self.llm.with_structured_output(RoutingDecision).invoke(messages)
+        return messages, user_query
 
+    def _route(self, context: AgentContext, decision: RoutingDecision, user_query: str, source: str) -> Command:
         next_step = decision["next"]
         if next_step == "FINISH":
             next_step = END
 
-        print("🔀 Routing decision:")
-        print(next_step)
-        print("💬 Reasoning:", decision["reasoning"])
+        record_routing(next_step, source, decision["reasoning"])
 
         update = {
             "next": next_step,
@@ -77,73 +148,165 @@ class DoctorAppointmentAgent:
         }
 
         if user_query:
+            removals, summary = compact_history(context["messages"], user_query, context.get("summary", ""))
             update["query"] = user_query
-            update["messages"] = [HumanMessage(content=f"User's identification number is {context['id_number']}")]
+            update["summary"] = summary
+            update["messages"] = removals + [HumanMessage(content=f"User's identification number is {context['id_number']}")]
 
         return Command(goto=next_step, update=update)
 
-    def information_node(self, context: AgentContext) -> Command[Literal["supervisor"]]:
-        print("📚 Entered information_node")
-
-        info_prompt = ChatPromptTemplate.from_messages([
-            ("system", 
-             "You are an assistant that answers FAQs or doctor availability queries. "
-             "Always consider the year to be 2024."),
-            ("placeholder", "{messages}"),
-        ])
-
-        info_agent = create_react_agent(
-            model=self.llm,
-            tools=[check_availability_by_doctor, check_availability_by_specialization],
-            prompt=info_prompt
-        )
-
-        result = info_agent.invoke(context)
-
+    @staticmethod
+    def _worker_reply(context: AgentContext, content: str, node_name: str) -> Command:
         return Command(
-            update={
-                "messages": context["messages"] + [
-                    AIMessage(content=result["messages"][-1].content, name="information_node")
-                ]
-            },
+            update={"messages": [AIMessage(content=content, name=node_name)]},
             goto="supervisor"
         )
 
-    def booking_node(self, context: AgentContext) -> Command[Literal["supervisor"]]:
-        print("📅 Entered booking_node")
+    def _history_key(self, context: AgentContext) -> str:
+        # Follow-ups like "yes please" mean different things in different
+        # conversations, so cached answers are also keyed by what came before
+        return history_fingerprint(context["messages"], self._turn_query(context), context.get("summary", ""))
 
-        booking_prompt = ChatPromptTemplate.from_messages([
-            ("system", 
-             "You manage appointments: setting, rescheduling, or canceling. "
-             "Always consider the year to be 2024."),
-            ("placeholder", "{messages}"),
-        ])
+    def _cached_routing(self, context: AgentContext, user_query: str) -> Tuple[Optional[RoutingDecision], str]:
+        decision = self.pre_router and self.pre_router.route(context)
+        if decision:
+            return decision, "fast_path"
+        # Only the first hop depends on the query and earlier turns alone
+        if user_query:
+            return self.routing_cache.get(cache_key(normalize_query(user_query), self._history_key(context))), "cache"
+        return None, "llm"
 
-        booking_agent = create_react_agent(
-            model=self.llm,
-            tools=[set_appointment, cancel_appointment, reschedule_appointment],
-            prompt=booking_prompt
-        )
+    def _store_routing(self, context: AgentContext, user_query: str, decision: RoutingDecision) -> None:
+        if user_query:
+            self.routing_cache.set(cache_key(normalize_query(user_query), self._history_key(context)), dict(decision))
 
-        result = booking_agent.invoke(context)
+    def _answer_key(self, context: AgentContext) -> str:
+        query = context.get("query") or context["messages"][0].content
+        return cache_key(normalize_query(query), self._history_key(context))
 
-        return Command(
-            update={
-                "messages": context["messages"] + [
-                    AIMessage(content=result["messages"][-1].content, name="booking_node")
-                ]
-            },
-            goto="supervisor"
+    def _cached_answer(self, key: str) -> Optional[str]:
+        """
+        Returns the cached availability answer under ``key`` while none of the
+        slots it was built from have changed since.
+        """
+        entry = self.answer_cache.get(key)
+        if entry is None:
+            return None
+        if list(get_availability_repository().versions(*entry["scope"])) != entry["versions"]:
+            return None
+        return entry["answer"]
+
+    def _store_answer(self, key: str, messages: List[Any], before: Tuple[int, ...]) -> None:
+        """
+        Caches the info agent's answer along with the versions of the slots its
+        tool calls read: their dates, doctors and specializations when every
+        call is bounded by them, all slots otherwise. Nothing is cached if any
+        slot changed while the agent ran, as its tools may have seen either state.
+        """
+        repository = get_availability_repository()
+        if repository.versions() != before:
+            return
+        scope = tool_call_scope(call for message in messages for call in getattr(message, "tool_calls", None) or [])
+        scope = [sorted(names) for names in scope or ((), (), ())]
+        self.answer_cache.set(
+            key, {"answer": messages[-1].content, "scope": scope, "versions": list(repository.versions(*scope))}
         )
 
+    def supervisor_node(self, context: AgentContext) -> Command[Literal["information_node", "booking_node", "__end__"]]:
+        with node_span("supervisor"):
+            messages, user_query = self._routing_request(context)
+            decision, source = self._cached_routing(context, user_query)
+            if not decision:
+                decision, source = self.router.invoke(messages), "llm"
+                self._store_routing(context, user_query, decision)
+            return self._route(context, decision, user_query, source)
+
+    async def asupervisor_node(self, context: AgentContext) -> Command[Literal["information_node", "booking_node", "__end__"]]:
+        with node_span("supervisor"):
+            messages, user_query = self._routing_request(context)
+            decision, source = self._cached_routing(context, user_query)
+            if not decision:
+                decision, source = await self.router.ainvoke(messages), "llm"
+                self._store_routing(context, user_query, decision)
+            return self._route(context, decision, user_query, source)
+
+    def information_node(self, context: AgentContext) -> Command[Literal["supervisor"]]:
+        with node_span("information_node") as span_attributes:
+            key = self._answer_key(context)
+            answer = self._cached_answer(key)
+            span_attributes["cached"] = answer is not None
+            if answer is None:
+                view, before = self._view(context), get_availability_repository().versions()
+                messages = self.info_agent.invoke({**context, "messages": view})["messages"][len(view):]
+                self._store_answer(key, messages, before)
+                answer = messages[-1].content
+            return self._worker_reply(context, answer, "information_node")
+
+    async def ainformation_node(self, context: AgentContext) -> Command[Literal["supervisor"]]:
+        with node_span("information_node") as span_attributes:
+            key = self._answer_key(context)
+            answer = self._cached_answer(key)
+            span_attributes["cached"] = answer is not None
+            if answer is None:
+                view, before = self._view(context), get_availability_repository().versions()
+                result = await self.info_agent.ainvoke({**context, "messages": view})
+                messages = result["messages"][len(view):]
+                self._store_answer(key, messages, before)
+                answer = messages[-1].content
+            return self._worker_reply(context, answer, "information_node")
+
+    def booking_node(self, context: AgentContext) -> Command[Literal["supervisor"]]:
+        with node_span("booking_node"):
+            result = self.booking_agent.invoke({**context, "messages": self._view(context)})
+            return self._worker_reply(context, result["messages"][-1].content, "booking_node")
+
+    async def abooking_node(self, context: AgentContext) -> Command[Literal["supervisor"]]:
+        with node_span("booking_node"):
+            result = await self.booking_agent.ainvoke({**context, "messages": self._view(context)})
+            return self._worker_reply(context, result["messages"][-1].content, "booking_node")
+
     def build_graph(self):
         """
         Constructs and compiles the multi-agent graph.
+
+        Every node has a sync and an async implementation, so the same compiled
+        graph serves both ``invoke`` and ``ainvoke``/``astream``. Sync tools are
+        run in the event loop's thread pool by the react agents.
         """
         workflow = StateGraph(AgentContext)
-        workflow.add_node("supervisor", self.supervisor_node)
-        workflow.add_node("information_node", self.information_node)
-        workflow.add_node("booking_node", self.booking_node)
+        workflow.add_node(
+            "supervisor", RunnableLambda(self.supervisor_node, afunc=self.asupervisor_node),
+            destinations=("information_node", "booking_node", END)
+        )
+        workflow.add_node(
+            "information_node", RunnableLambda(self.information_node, afunc=self.ainformation_node),
+            destinations=("supervisor",)
+        )
+        workflow.add_node(
+            "booking_node", RunnableLambda(self.booking_node, afunc=self.abooking_node),
+            destinations=("supervisor",)
+        )
         workflow.add_edge(START, "supervisor")
-        self.app = workflow.compile()
+        self.app = workflow.compile(checkpointer=self.checkpointer)
         return self.app
+
+    def workflow(self):
+        """
+        Returns the compiled graph, building it on first use.
+        """
+        if self.app is None:
+            with self._graph_lock:
+                if self.app is None:
+                    self.build_graph()
+        return self.app
+
+    def warm_up(self, checkpointer=None):
+        """
+        Compiles the graph and loads the availability data ahead of the first request.
+        A ``checkpointer`` given here is used for per-patient session persistence.
+        """
+        if checkpointer is not None:
+            self.checkpointer = checkpointer
+            self.app = None
+        get_availability_repository()
+        return self.workflow()
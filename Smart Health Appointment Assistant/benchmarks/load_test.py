@@ -0,0 +1,350 @@
+"""
+End-to-end load test of the appointment agent against a scripted local model.
+
+For every scale the synthetic schedule is generated once, then each mode runs
+in a fresh subprocess so module-level singletons (repository, caches, agent)
+start cold:
+
+* ``graph``: ``DoctorAppointmentAgent`` invoked directly
+* ``http``: the FastAPI ``/execute`` endpoint through an in-process ASGI client
+
+N concurrent patients each send a sequence of availability, booking, cancel
+and reschedule requests. The report is JSON with p50/p95/p99 latency,
+throughput, LLM calls per request and booking outcomes per run.
+
+    python -m benchmarks.load_test --scales 10 100 1000 --patients 200 --output bench.json
+    python -m benchmarks.load_test --scales 10 --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_schedule import generate_schedule
+
+KINDS = ["availability", "book", "cancel", "reschedule"]
+
+# Reply prefixes of the tools, as relayed by the scripted model
+OUTCOMES = [
+    ("Appointment successfully set", "booked"),
+    ("Appointment successfully cancelled", "cancelled"),
+    ("Appointment successfully rescheduled", "rescheduled"),
+    ("No available appointments", "conflict"),
+    ("No available slots", "conflict"),
+    ("You don’t have any appointment", "not_found"),
+    ("Doctor availability", "answered"),
+    ("No availability", "answered"),
+    ("Error", "tool_error"),
+]
+
+# Rows read from the head of the schedule to pick the slots patients ask for
+POOL_ROWS = 50_000
+
+
+def classify(reply: str) -> str:
+    for prefix, outcome in OUTCOMES:
+        if reply.startswith(prefix):
+            return outcome
+    return "other"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "mean": round(float(np.mean(values)), 2),
+        "max": round(float(np.max(values)), 2),
+    }
+
+
+def summarize(records: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    outcomes = Counter(record["outcome"] for record in records)
+    booking_attempts = [record for record in records if record["kind"] in ("book", "reschedule")]
+    by_kind = defaultdict(list)
+    for record in records:
+        by_kind[record["kind"]].append(record["latency_ms"])
+
+    return {
+        "requests": len(records),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(records) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": percentiles([record["latency_ms"] for record in records]),
+        "llm_calls_per_request": percentiles([record["llm_calls"] for record in records]),
+        "outcomes": dict(outcomes),
+        "bookings": {
+            "attempted": len(booking_attempts),
+            "succeeded": sum(record["outcome"] in ("booked", "rescheduled") for record in booking_attempts),
+            "conflicts": sum(record["outcome"] == "conflict" for record in booking_attempts),
+        },
+        "by_kind": {kind: {"count": len(values), **percentiles(values)} for kind, values in sorted(by_kind.items())},
+    }
+
+
+def slot_pool(csv_path: str, hot_slots: int, seed: int):
+    """
+    Returns free (date_slot, doctor) pairs from the start of the schedule, and
+    the ``hot_slots`` of them bookings compete for.
+    """
+    head = pd.read_csv(csv_path, usecols=["date_slot", "doctor_name", "is_available"], nrows=POOL_ROWS, dtype=str)
+    free = head[head["is_available"].str.upper() == "TRUE"]
+    pool = list(zip(free["date_slot"], free["doctor_name"]))
+    hot = random.Random(seed).sample(pool, min(hot_slots, len(pool)))
+    return pool, hot
+
+
+# === Worker (runs in a subprocess per scale and mode) ===
+
+async def run_patients(send, arguments, pool, hot) -> List[Dict[str, Any]]:
+    from benchmarks.scripted_llm import llm_calls
+
+    weights = [arguments.mix[kind] for kind in KINDS]
+    hot_by_doctor = defaultdict(list)
+    for date_slot, doctor in hot:
+        hot_by_doctor[doctor].append(date_slot)
+    records: List[Dict[str, Any]] = []
+
+    async def patient(index: int) -> None:
+        rng = random.Random(arguments.seed * 1_000_003 + index)
+        id_number = 2_000_000 + index
+        held: List[tuple] = []
+        for _ in range(arguments.requests_per_patient):
+            kind = rng.choices(KINDS, weights)[0]
+            if kind in ("cancel", "reschedule") and not held:
+                kind = "book"
+            if kind == "reschedule" and not hot_by_doctor.get(held[-1][1]):
+                kind = "cancel"
+
+            if kind == "availability":
+                date_slot, doctor = rng.choice(pool)
+                query = f"Is {doctor} available on {date_slot[:10]}?"
+            elif kind == "book":
+                date_slot, doctor = rng.choice(hot)
+                query = f"Book {doctor} on {date_slot}"
+            elif kind == "cancel":
+                date_slot, doctor = held.pop(rng.randrange(len(held)))
+                query = f"Cancel my appointment with {doctor} on {date_slot}"
+            else:
+                date_slot, doctor = held[-1]
+                new_slot = rng.choice(hot_by_doctor[doctor])
+                query = f"Move my appointment with {doctor} from {date_slot} to {new_slot}"
+
+            calls = [0]
+            token = llm_calls.set(calls)
+            start = time.perf_counter()
+            try:
+                outcome = classify(await send(id_number, query))
+            except Exception as ex:
+                outcome = "error"
+                print(f"request failed: {type(ex).__name__}: {ex}", file=sys.stderr)
+            latency_ms = (time.perf_counter() - start) * 1000
+            llm_calls.reset(token)
+
+            if outcome == "booked":
+                held.append((date_slot, doctor))
+            elif outcome == "rescheduled":
+                held[-1] = (new_slot, doctor)
+            records.append({"kind": kind, "outcome": outcome, "latency_ms": latency_ms, "llm_calls": calls[0]})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(patient(index) for index in range(arguments.patients)))
+    arguments.wall_seconds = time.perf_counter() - start
+    return records
+
+
+async def run_worker(arguments) -> Dict[str, Any]:
+    from benchmarks import scripted_llm
+
+    scripted_llm.register(arguments.llm_latency_ms)
+
+    from langchain_core.messages import HumanMessage
+    from toolkit.availability import get_availability_repository
+
+    start = time.perf_counter()
+    get_availability_repository()
+    load_seconds = time.perf_counter() - start
+    pool, hot = slot_pool(arguments.schedule, arguments.hot_slots, arguments.seed)
+
+    if arguments.mode == "http":
+        import httpx
+        import main
+
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                async def send(id_number: int, query: str) -> str:
+                    response = await client.post("/execute", json={"query": query, "id_number": id_number})
+                    response.raise_for_status()
+                    return response.json()["messages"][-1]["content"]
+
+                records = await run_patients(send, arguments, pool, hot)
+    else:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        from agent import DoctorAppointmentAgent
+
+        agent = DoctorAppointmentAgent()
+        async with AsyncSqliteSaver.from_conn_string(os.environ["SESSION_DB_PATH"]) as checkpointer:
+            agent.warm_up(checkpointer=checkpointer)
+            app = agent.workflow()
+
+            async def send(id_number: int, query: str) -> str:
+                result = await app.ainvoke(
+                    {
+                        "messages": [HumanMessage(content=query)],
+                        "id_number": id_number,
+                        "next": "",
+                        "query": query,
+                        "current_reasoning": "",
+                    },
+                    config={"recursion_limit": 20, "configurable": {"thread_id": f"patient-{id_number}"}},
+                )
+                return result["messages"][-1].content
+
+            records = await run_patients(send, arguments, pool, hot)
+
+    return {
+        "scale": arguments.scale,
+        "mode": arguments.mode,
+        "load_seconds": round(load_seconds, 3),
+        **summarize(records, arguments.wall_seconds),
+    }
+
+
+# === Orchestrator ===
+
+def run_scale(scale: int, mode: str, schedule: str, arguments) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as directory:
+        result_path = os.path.join(directory, "result.json")
+        env = {
+            **os.environ,
+            "LLM_BACKEND": "scripted",
+            "LLM_MODEL": "scripted",
+            "LOG_LEVEL": "WARNING",
+            "SCHEDULE_CSV_PATH": schedule,
+            "BOOKING_STORE": arguments.store,
+            "BOOKING_DB_PATH": os.path.join(directory, "bookings.db"),
+            "SESSION_DB_PATH": os.path.join(directory, "sessions.db"),
+        }
+        for variable in ("AGENT_CACHE_PATH", "LLM_HEDGE_BACKEND"):
+            env.pop(variable, None)
+        command = [
+            sys.executable, "-m", "benchmarks.load_test", "--worker",
+            "--scale", str(scale), "--mode", mode, "--schedule", schedule, "--result", result_path,
+            "--patients", str(arguments.patients),
+            "--requests-per-patient", str(arguments.requests_per_patient),
+            "--mix", ",".join(f"{kind}={weight}" for kind, weight in arguments.mix.items()),
+            "--hot-slots", str(arguments.hot_slots),
+            "--llm-latency-ms", str(arguments.llm_latency_ms),
+            "--seed", str(arguments.seed),
+        ]
+        subprocess.run(command, env=env, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with open(result_path) as handle:
+            return json.load(handle)
+
+
+def regressions(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Lists runs whose p95 latency rose, or throughput fell, by more than ``threshold``.
+    """
+    previous = {(run["scale"], run["mode"]): run for run in baseline["runs"]}
+    found = []
+    for run in report["runs"]:
+        before = previous.get((run["scale"], run["mode"]))
+        if before is None:
+            continue
+        label = f"x{run['scale']} {run['mode']}"
+        if run["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + threshold):
+            found.append(f"{label}: p95 {before['latency_ms']['p95']} -> {run['latency_ms']['p95']} ms")
+        if run["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            found.append(f"{label}: throughput {before['throughput_rps']} -> {run['throughput_rps']} rps")
+    return found
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {kind: 0.0 for kind in KINDS}
+    for part in value.split(","):
+        kind, weight = part.split("=")
+        if kind not in mix:
+            raise argparse.ArgumentTypeError(f"Unknown request kind '{kind}'. Choose from: {', '.join(KINDS)}.")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the appointment agent with a scripted model.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000], help="Schedule size multiples")
+    parser.add_argument("--modes", nargs="+", choices=["graph", "http"], default=["graph", "http"])
+    parser.add_argument("--patients", type=int, default=100, help="Concurrent patients")
+    parser.add_argument("--requests-per-patient", type=int, default=4)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("availability=0.4,book=0.3,cancel=0.15,reschedule=0.15"))
+    parser.add_argument("--hot-slots", type=int, default=200, help="Slots bookings compete for")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Simulated latency of each model call")
+    parser.add_argument("--store", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Tolerated relative regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--schedule", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        result = asyncio.run(run_worker(arguments))
+        with open(arguments.result, "w") as handle:
+            json.dump(result, handle)
+        return
+
+    runs = []
+    for scale in arguments.scales:
+        start = time.perf_counter()
+        schedule = generate_schedule(scale, seed=arguments.seed)
+        generate_seconds = round(time.perf_counter() - start, 3)
+        with open(schedule, "rb") as handle:
+            rows = sum(1 for _ in handle) - 1
+        for mode in arguments.modes:
+            print(f"running x{scale} {mode}", file=sys.stderr)
+            result = run_scale(scale, mode, schedule, arguments)
+            runs.append({**result, "rows": rows, "generate_seconds": generate_seconds})
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            key: getattr(arguments, key)
+            for key in ("patients", "requests_per_patient", "mix", "hot_slots", "llm_latency_ms", "store", "seed")
+        },
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as handle:
+            handle.write(output)
+    else:
+        print(output)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as handle:
+            found = regressions(report, json.load(handle), arguments.threshold)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from utils.llms import register_backend
+
+# Calls made by the scripted model for the request running in this context
+llm_calls: ContextVar[Optional[List[int]]] = ContextVar("llm_calls", default=None)
+
+DATE = r"\d{2}-\d{2}-\d{4}"
+DATETIME = r"\d{2}-\d{2}-\d{4} \d{2}:\d{2}"
+ID_PATTERN = re.compile(r"identification number is (\d+)")
+
+# Queries written by the load generator, the tool each one calls and the worker handling it
+SCRIPTS = [
+    (re.compile(rf"^Is (?P<doctor>.+) available on (?P<date>{DATE})\?$"), "check_availability_by_doctor", "information_node"),
+    (re.compile(rf"^Book (?P<doctor>.+) on (?P<datetime>{DATETIME})$"), "set_appointment", "booking_node"),
+    (re.compile(rf"^Cancel my appointment with (?P<doctor>.+) on (?P<datetime>{DATETIME})$"), "cancel_appointment", "booking_node"),
+    (
+        re.compile(rf"^Move my appointment with (?P<doctor>.+) from (?P<old>{DATETIME}) to (?P<new>{DATETIME})$"),
+        "reschedule_appointment",
+        "booking_node",
+    ),
+]
+
+
+def _content(message: Any) -> str:
+    return message["content"] if isinstance(message, dict) else str(message.content)
+
+
+def _count() -> None:
+    calls = llm_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def _script(messages: List[Any]):
+    """
+    Returns (match, tool, worker, replied) for the latest scripted query, where
+    ``replied`` tells whether a worker already answered it.
+    """
+    replied = False
+    for message in reversed(messages):
+        if getattr(message, "name", None):
+            replied = True
+        for pattern, tool, worker in SCRIPTS:
+            match = pattern.match(_content(message))
+            if match:
+                return match, tool, worker, replied
+    return None, None, None, replied
+
+
+def _tool_args(tool: str, match: re.Match, id_number: int) -> Dict[str, Any]:
+    patient = {"id_number": id_number}
+    doctor = match["doctor"]
+    if tool == "check_availability_by_doctor":
+        return {"desired_date": {"date_str": match["date"]}, "doctor_name": doctor}
+    if tool == "set_appointment":
+        return {"desired_date": {"datetime_str": match["datetime"]}, "id_number": patient, "doctor_name": doctor}
+    if tool == "cancel_appointment":
+        return {"date": {"datetime_str": match["datetime"]}, "id_number": patient, "doctor_name": doctor}
+    return {
+        "old_date": {"datetime_str": match["old"]},
+        "new_date": {"datetime_str": match["new"]},
+        "id_number": patient,
+        "doctor_name": doctor,
+    }
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Stand-in chat model that drives the agent through the tool call each
+    load-generator query asks for, after ``latency_ms`` of simulated model time.
+
+    The worker model calls the matching tool and then answers with the tool's
+    output; the supervisor's structured output routes to the matching worker
+    and finishes once it has replied. Every call is counted in ``llm_calls``.
+    """
+
+    latency_ms: float = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        _count()
+        if messages and isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content=str(messages[-1].content))
+        else:
+            match, tool, _, _ = _script(messages)
+            ids = [ID_PATTERN.search(_content(message)) for message in messages]
+            id_number = next((int(found.group(1)) for found in reversed(ids) if found), 0)
+            if match is None:
+                message = AIMessage(content="I can only help with appointments.")
+            else:
+                message = AIMessage(
+                    content="",
+                    tool_calls=[{"name": tool, "args": _tool_args(tool, match, id_number), "id": f"call_{uuid.uuid4().hex}"}],
+                )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._reply(messages)
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        def route(messages: List[Any]) -> Dict[str, str]:
+            _count()
+            match, _, worker, replied = _script(messages)
+            if match is None or replied:
+                return {"next": "FINISH", "reasoning": "The request has been handled."}
+            return {"next": worker, "reasoning": f"Scripted route to {worker}."}
+
+        def run(messages: List[Any]) -> Dict[str, str]:
+            time.sleep(self.latency_ms / 1000)
+            return route(messages)
+
+        async def arun(messages: List[Any]) -> Dict[str, str]:
+            await asyncio.sleep(self.latency_ms / 1000)
+            return route(messages)
+
+        return RunnableLambda(run, afunc=arun, name="ScriptedRouter")
+
+
+def register(latency_ms: float = 0) -> None:
+    """
+    Registers the model as the 'scripted' LLM backend.
+    """
+    register_backend("scripted")(lambda model_name: ScriptedChatModel(latency_ms=latency_ms))
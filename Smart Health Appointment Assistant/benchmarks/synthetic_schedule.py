@@ -0,0 +1,69 @@
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from toolkit.availability import CSV_FILE
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".cache", "benchmarks")
+
+
+def generate_schedule(scale: int, path: Optional[str] = None, seed: int = 42, base_csv: str = CSV_FILE) -> str:
+    """
+    Writes a synthetic schedule ``scale`` times the size of ``base_csv``.
+
+    The base schedule's days and hours are kept and its doctors are cloned
+    ``scale`` times ('dr. john doe', 'dr. john doe 2', ...), each clone with its
+    own rooms. Specialization, availability, assistant presence and booked
+    patients are drawn with the base file's frequencies. Returns the path, and
+    reuses an existing file generated with the same scale and seed.
+    """
+    path = path or os.path.join(BENCHMARK_DIR, f"schedule_x{scale}_seed{seed}.csv")
+    if os.path.exists(path):
+        return path
+
+    base = pd.read_csv(base_csv, dtype=str)
+    rng = np.random.default_rng(seed)
+
+    slots = pd.to_datetime(base["date_slot"], format="%d-%m-%Y %H:%M").drop_duplicates().sort_values()
+    slot_strings = slots.dt.strftime("%d-%m-%Y %H:%M").to_numpy(dtype=object)
+    base_doctors = np.array(sorted(base["doctor_name"].unique()), dtype=object)
+    doctors = np.array(
+        [name if clone == 0 else f"{name} {clone + 1}" for clone in range(scale) for name in base_doctors],
+        dtype=object,
+    )
+    rooms_per_clone = base["room_number"].nunique()
+
+    rows = len(slot_strings) * len(doctors)
+    specializations, weights = np.unique(base["specialization"], return_counts=True)
+    available = rng.random(rows) < (base["is_available"].str.upper() == "TRUE").mean()
+    patients = rng.integers(1_000_000, 10_000_000, rows).astype(object)
+    patients[available] = ""
+    clone_of_row = np.tile(np.repeat(np.arange(scale), len(base_doctors)), len(slot_strings))
+
+    frame = pd.DataFrame({
+        "date_slot": np.repeat(slot_strings, len(doctors)),
+        "specialization": rng.choice(specializations, rows, p=weights / weights.sum()),
+        "doctor_name": np.tile(doctors, len(slot_strings)),
+        "is_available": np.where(available, "TRUE", "FALSE"),
+        "patient_to_attend": patients,
+        "room_number": np.char.add("Room-", (rng.integers(1, rooms_per_clone + 1, rows) + clone_of_row * rooms_per_clone).astype(str)),
+        "assistant_present": np.where(rng.random(rows) < (base["assistant_present"] == "Yes").mean(), "Yes", "No"),
+    })
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    frame.to_csv(temporary, index=False)
+    os.replace(temporary, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic doctor schedule.")
+    parser.add_argument("scale", type=int, help="Multiple of the base schedule's size")
+    parser.add_argument("--output", help="CSV path (default: data/.cache/benchmarks/)")
+    parser.add_argument("--seed", type=int, default=42)
+    arguments = parser.parse_args()
+    print(generate_schedule(arguments.scale, arguments.output, arguments.seed))
@@ -1,5 +1,8 @@
 import re
-from pydantic import BaseModel, Field, field_validator
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from toolkit.slot_index import MAX_SEARCH_DAYS
 
 
 class AppointmentDateTime(BaseModel):
@@ -36,6 +39,23 @@ class AppointmentDate(BaseModel):
         return value
 
 
+class AppointmentTime(BaseModel):
+    """
+    Validates time of day in 'HH:MM' format.
+    Example: '14:00'
+    """
+    time_str: str = Field(
+        description="Time of day in 'HH:MM' 24-hour format",
+        pattern=r'^\d{2}:\d{2}$'
+    )
+
+    @field_validator("time_str")
+    def validate_time_format(cls, value: str) -> str:
+        if not re.match(r'^([01]\d|2[0-3]):[0-5]\d$', value):
+            raise ValueError("Time must be in format 'HH:MM'")
+        return value
+
+
 class PatientID(BaseModel):
     """
     Validates patient ID as a 7 or 8-digit numeric identifier.
@@ -50,4 +70,36 @@ class PatientID(BaseModel):
         return value
 
 
+class WaitlistEntry(BaseModel):
+    """
+    A waitlisted patient's slot preferences.
+    Example: {"id_number": 1000097, "start_date": "05-08-2024", "end_date": "09-08-2024",
+              "specialization": "orthodontist", "earliest_time": "09:00", "needs_assistant": true}
+    """
+    id_number: int = Field(description="7 or 8-digit patient ID number")
+    start_date: str = Field(description="First acceptable date in 'DD-MM-YYYY' format", pattern=r'^\d{2}-\d{2}-\d{4}$')
+    end_date: str = Field(description="Last acceptable date in 'DD-MM-YYYY' format", pattern=r'^\d{2}-\d{2}-\d{4}$')
+    specialization: Optional[str] = Field(default=None, description="Required specialization, if any")
+    doctor_name: Optional[str] = Field(default=None, description="Required doctor, if any")
+    earliest_time: str = Field(default="00:00", description="Earliest acceptable time in 'HH:MM' format", pattern=r'^\d{2}:\d{2}$')
+    latest_time: str = Field(default="23:59", description="Latest acceptable time in 'HH:MM' format", pattern=r'^\d{2}:\d{2}$')
+    needs_assistant: bool = Field(default=False, description="Whether a dental assistant must be present")
+    priority: int = Field(default=0, description="Higher values are allocated first")
+
+    @field_validator("id_number")
+    def validate_id_format(cls, value: int) -> int:
+        if not re.match(r'^\d{7,8}$', str(value)):
+            raise ValueError("ID number must be a 7 or 8-digit numeric value")
+        return value
 
+    @model_validator(mode="after")
+    def validate_range(self) -> "WaitlistEntry":
+        span = datetime.strptime(self.end_date, "%d-%m-%Y") - datetime.strptime(self.start_date, "%d-%m-%Y")
+        if span.days < 0:
+            raise ValueError("end_date must not be before start_date")
+        # Allocation scans every day of the range for each waitlist group
+        if span.days >= MAX_SEARCH_DAYS:
+            raise ValueError(f"The date range may span at most {MAX_SEARCH_DAYS} days")
+        if self.latest_time < self.earliest_time:
+            raise ValueError("latest_time must not be before earliest_time")
+        return self
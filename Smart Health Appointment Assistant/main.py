@@ -1,38 +1,223 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import time
+import weakref
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from agent import DoctorAppointmentAgent
+from data_models.models import WaitlistEntry
 from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from toolkit.availability import get_availability_repository
+from toolkit.toolkits import resolve_waitlist
+from utils.instrumentation import REQUEST_LATENCY, MetricsCallbackHandler, configure_logging, span
 import os
 
 # Remove environment variable that may cause SSL issues
 os.environ.pop("SSL_CERT_FILE", None)
 
+# Maximum number of graph runs in flight per worker
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "256"))
+# Threads available to sync tools (pandas / IO) called from the async graph
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "32"))
+# Largest number of patient requests accepted by /execute/batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+# Largest waitlist accepted by /waitlist/allocate
+MAX_WAITLIST_SIZE = int(os.getenv("MAX_WAITLIST_SIZE", "10000"))
+# SQLite file holding per-patient conversation checkpoints
+SESSION_DB_PATH = os.getenv(
+    "SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db")
+)
+
+configure_logging()
+
+# Initialize the agent
+appointment_agent = DoctorAppointmentAgent()
+run_slots = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+# Records LLM and tool spans for every graph run, including the react sub-agents
+metrics_callback = MetricsCallbackHandler()
+# One in-flight run per patient, so turns of the same session don't interleave
+patient_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync tools are dispatched to the loop's default executor
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=TOOL_THREADS))
+    # Compile the graph once, with per-patient sessions checkpointed to SQLite
+    async with AsyncSqliteSaver.from_conn_string(SESSION_DB_PATH) as checkpointer:
+        appointment_agent.warm_up(checkpointer=checkpointer)
+        yield
+
 # Initialize FastAPI app
-app = FastAPI(title="Doctor Appointment Agentic API")
+app = FastAPI(title="Doctor Appointment Agentic API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    try:
+        with span("request", request.url.path, method=request.method) as attributes:
+            response = await call_next(request)
+            attributes["status_code"] = response.status_code
+    finally:
+        # Labeled by route template, so path parameters and unknown paths don't each add a series
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(route.path if route is not None else "unmatched").observe(time.perf_counter() - start)
+    return response
 
 # Pydantic model to structure incoming request
 class UserInput(BaseModel):
     id_number: int
     query: str
 
-# Initialize the agent
-appointment_agent = DoctorAppointmentAgent()
 
-@app.post("/execute")
-def run_agent(user_input: UserInput):
-    # Build the workflow
-    agent_workflow = appointment_agent.workflow()
+class WaitlistInput(BaseModel):
+    entries: List[WaitlistEntry]
+    commit: bool = True
 
-    # Prepare the initial state for the agent
-    initial_state = {
+
+def build_initial_state(user_input: UserInput) -> dict:
+    """
+    Prepares the input for a patient's new turn. The message is appended to
+    the checkpointed history; ``summary`` is left out so it carries over.
+    """
+    return {
         "messages": [HumanMessage(content=user_input.query)],
         "id_number": user_input.id_number,
         "next": "",
-        "query": "",
+        "query": user_input.query,
         "current_reasoning": "",
     }
 
+
+def run_config(id_number: int) -> dict:
+    """
+    Config shared by every graph run. Runs for the same patient share a
+    checkpoint thread.
+    """
+    return {
+        "recursion_limit": 20,
+        "callbacks": [metrics_callback],
+        "configurable": {"thread_id": f"patient-{id_number}"},
+    }
+
+
+def patient_lock(id_number: int) -> asyncio.Lock:
+    lock = patient_locks.get(id_number)
+    if lock is None:
+        lock = patient_locks[id_number] = asyncio.Lock()
+    return lock
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Formats a server-sent event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/execute")
+async def run_agent(user_input: UserInput):
+    # Reuse the compiled workflow
+    agent_workflow = appointment_agent.workflow()
+
     # Execute the workflow
-    result = agent_workflow.invoke(initial_state, config={"recursion_limit": 20})
-    
+    async with patient_lock(user_input.id_number), run_slots:
+        result = await agent_workflow.ainvoke(
+            build_initial_state(user_input), config=run_config(user_input.id_number)
+        )
+
     return {"messages": result["messages"]}
+
+
+@app.post("/execute/batch")
+async def run_agent_batch(user_inputs: List[UserInput]):
+    if len(user_inputs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {MAX_BATCH_SIZE} requests")
+
+    agent_workflow = appointment_agent.workflow()
+
+    async def run_one(index: int, user_input: UserInput) -> dict:
+        item = {"index": index, "id_number": user_input.id_number}
+        try:
+            async with patient_lock(user_input.id_number), run_slots:
+                result = await agent_workflow.ainvoke(
+                    build_initial_state(user_input), config=run_config(user_input.id_number)
+                )
+            item["messages"] = result["messages"]
+        except Exception as ex:
+            item["error"] = f"{type(ex).__name__}: {ex}"
+        return item
+
+    # Runs share the concurrency limit with /execute; one failure doesn't fail the batch
+    results = await asyncio.gather(*(run_one(index, user_input) for index, user_input in enumerate(user_inputs)))
+    return {"results": results}
+
+
+@app.post("/execute/stream")
+async def stream_agent(user_input: UserInput):
+    agent_workflow = appointment_agent.workflow()
+
+    async def events():
+        async with patient_lock(user_input.id_number), run_slots:
+            async for mode, chunk in agent_workflow.astream(
+                build_initial_state(user_input),
+                config=run_config(user_input.id_number),
+                stream_mode=["updates", "messages"],
+            ):
+                if mode == "messages":
+                    message, metadata = chunk
+                    # The checkpoint namespace starts with the top-level graph node
+                    node = metadata.get("langgraph_checkpoint_ns", "").split(":")[0]
+                    if node != "supervisor" and message.content:
+                        yield sse_event("token", {"node": node, "content": message.content})
+                    continue
+
+                for node, update in chunk.items():
+                    update = update or {}
+                    progress = {"node": node, "next": update.get("next"), "reasoning": update.get("current_reasoning")}
+                    worker_messages = update.get("messages") or []
+                    if node != "supervisor" and worker_messages:
+                        progress["content"] = worker_messages[-1].content
+                    yield sse_event("node", progress)
+
+        yield sse_event("end", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/waitlist/allocate")
+async def allocate_waitlist(waitlist: WaitlistInput):
+    if len(waitlist.entries) > MAX_WAITLIST_SIZE:
+        raise HTTPException(status_code=413, detail=f"A waitlist may contain at most {MAX_WAITLIST_SIZE} entries")
+
+    requests, errors = resolve_waitlist(waitlist.entries)
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    # Allocation is CPU-bound; keep it off the event loop
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: get_availability_repository().allocate(requests, commit=waitlist.commit)
+    )
+    if waitlist.commit and result["assigned"] and not result["committed"]:
+        raise HTTPException(status_code=409, detail="The slots changed while booking the waitlist, please retry")
+    return result
+
+
+@app.get("/router/stats")
+def router_stats():
+    # How often the supervisor was answered without an LLM call
+    if not appointment_agent.pre_router:
+        return {}
+    return appointment_agent.pre_router.stats()
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus scrape endpoint: request, node, LLM and tool latency histograms
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,20 @@
 # Define specialized agent roles for the assistant system
 agent_registry = {
     "information_node": "Handles inquiries related to doctor availability, hospital FAQs, and general information.",
-    "booking_node": "Responsible for managing appointment bookings, cancellations, and rescheduling tasks."
+    "booking_node": "Responsible for managing appointment bookings, cancellations, rescheduling and bulk waitlist allocation tasks."
+}
+
+# Phrases that signal a worker's intent without ambiguity, used by the fast-path router
+agent_keywords = {
+    "information_node": [
+        r"\bavailab", r"\bfree\b", r"\bopen (slot|time)", r"\bwhich doctors?\b",
+        r"\bwho is\b", r"\bwhen (is|are|can)\b", r"\bfaq",
+        r"\bearliest\b", r"\bnext (free|open)\b",
+    ],
+    "booking_node": [
+        r"\bbook", r"\breschedul", r"\bcancel", r"\bset (an |up an |up )?appointment",
+        r"\bschedule (an|a|me)\b", r"\bmove my\b", r"\bchange my appointment", r"\bwaitlist",
+    ],
 }
 
 # Define routing options, including terminal state
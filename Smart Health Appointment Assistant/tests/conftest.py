@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Tests run against the bundled schedule with bookings in memory and no LLM provider
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ["BOOKING_STORE"] = "memory"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import toolkit.availability as availability  # noqa: E402
+import toolkit.catalog as catalog  # noqa: E402
+from toolkit.booking_store import InMemoryBookingStore  # noqa: E402
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    """
+    A fresh availability repository over the bundled schedule, installed as the process-wide one.
+    """
+    fresh = availability.AvailabilityRepository(store=InMemoryBookingStore())
+    monkeypatch.setattr(availability, "_repository", fresh)
+    monkeypatch.setattr(catalog, "_catalog", None)
+    return fresh
@@ -0,0 +1,122 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import DoctorAppointmentAgent
+from toolkit.toolkits import check_availability_range, find_next_available
+
+PATIENT = 1000082
+
+
+class ScriptedInfoAgent:
+    """
+    Stands in for the info react agent: makes one tool call and answers with its output.
+    """
+
+    def __init__(self, tool, args):
+        self.tool = tool
+        self.args = args
+        self.calls = 0
+
+    def invoke(self, state):
+        self.calls += 1
+        call = {"name": self.tool.name, "args": self.args, "id": f"call-{self.calls}"}
+        output = self.tool.invoke(self.args)
+        return {
+            "messages": state["messages"] + [
+                AIMessage(content="", tool_calls=[call]),
+                ToolMessage(content=output, tool_call_id=call["id"]),
+                AIMessage(content=output),
+            ]
+        }
+
+
+def ask(agent, query):
+    context = {"messages": [HumanMessage(content=query)], "query": query, "id_number": PATIENT, "summary": ""}
+    return agent.information_node(context).update["messages"][-1].content
+
+
+def make_agent(tool, args):
+    agent = DoctorAppointmentAgent(pre_router=False)
+    agent.info_agent = ScriptedInfoAgent(tool, args)
+    return agent
+
+
+def other_doctor(repository, doctor_name):
+    # A doctor sharing neither name nor specialization with doctor_name
+    rows = repository._frame
+    specialization = rows.loc[rows["doctor_name"] == doctor_name, "specialization"].iloc[0]
+    return rows.loc[rows["specialization"] != specialization, "doctor_name"].iloc[0]
+
+
+def test_range_answer_is_invalidated_by_a_booking_inside_the_range(repository):
+    agent = make_agent(check_availability_range, {
+        "start_date": {"date_str": "05-08-2024"},
+        "end_date": {"date_str": "09-08-2024"},
+        "doctor_name": "John Doe",
+    })
+    query = "Is John Doe free between 05-08-2024 and 09-08-2024?"
+    first = ask(agent, query)
+    assert ask(agent, query) == first
+    assert agent.info_agent.calls == 1
+
+    time = repository.available_slots_by_doctor("07-08-2024", "dr. john doe")[0]
+    assert repository.book(f"07-08-2024 {time}", "dr. john doe", PATIENT)
+
+    assert ask(agent, query) != first
+    assert agent.info_agent.calls == 2
+
+
+def test_next_available_answer_is_invalidated_by_booking_the_slot_it_named(repository):
+    # Nothing left on the start date, so the answer names a later day
+    for time in repository.available_slots_by_doctor("05-08-2024", "dr. john doe"):
+        assert repository.book(f"05-08-2024 {time}", "dr. john doe", PATIENT)
+    agent = make_agent(find_next_available, {"start_date": {"date_str": "05-08-2024"}, "doctor_name": "John Doe"})
+    query = "When is John Doe next available after 05-08-2024?"
+    first = ask(agent, query)
+    assert ask(agent, query) == first
+
+    date, time, _ = repository.next_available("05-08-2024", doctor_name="dr. john doe")
+    assert date != "05-08-2024"
+    assert repository.book(f"{date} {time}", "dr. john doe", PATIENT)
+
+    assert ask(agent, query) != first
+    assert agent.info_agent.calls == 2
+
+
+def test_partial_name_answer_is_invalidated_by_a_booking_of_the_resolved_doctor(repository):
+    agent = make_agent(check_availability_range, {
+        "start_date": {"date_str": "05-08-2024"},
+        "end_date": {"date_str": "09-08-2024"},
+        "doctor_name": "john d.",
+    })
+    query = "Is john d. free from 05-08-2024 to 09-08-2024?"
+    first = ask(agent, query)
+
+    # Another doctor, specialization and week: the answer still holds
+    unrelated = other_doctor(repository, "dr. john doe")
+    time = repository.available_slots_by_doctor("12-08-2024", unrelated)[0]
+    assert repository.book(f"12-08-2024 {time}", unrelated, PATIENT)
+    assert ask(agent, query) == first
+    assert agent.info_agent.calls == 1
+
+    time = repository.available_slots_by_doctor("08-08-2024", "dr. john doe")[0]
+    assert repository.book(f"08-08-2024 {time}", "dr. john doe", PATIENT)
+    assert ask(agent, query) != first
+    assert agent.info_agent.calls == 2
+
+
+def test_answer_from_an_unbounded_call_is_invalidated_by_any_booking(repository):
+    # The doctor doesn't resolve, so the call can't be bounded by name
+    agent = make_agent(check_availability_range, {
+        "start_date": {"date_str": "05-08-2024"},
+        "end_date": {"date_str": "09-08-2024"},
+        "doctor_name": "nobody",
+    })
+    query = "Is nobody free next week?"
+    ask(agent, query)
+
+    unrelated = other_doctor(repository, "dr. john doe")
+    time = repository.available_slots_by_doctor("12-08-2024", unrelated)[0]
+    assert repository.book(f"12-08-2024 {time}", unrelated, PATIENT)
+
+    ask(agent, query)
+    assert agent.info_agent.calls == 2
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import utils.llms as llms
+from utils.llms import ResilientChatModel
+
+
+class StatusError(Exception):
+    """
+    Shaped like the provider SDKs' HTTP status errors.
+    """
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def failing(error):
+    calls = []
+
+    def call(_):
+        calls.append(1)
+        raise error
+
+    async def acall(_):
+        calls.append(1)
+        raise error
+
+    return RunnableLambda(call, afunc=acall), calls
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llms, "backoff", lambda attempt: 0)
+
+
+@pytest.mark.parametrize("error", [StatusError(401), StatusError(422), ValueError("unparseable output")])
+def test_non_transient_errors_are_not_retried(error):
+    primary, calls = failing(error)
+    model = ResilientChatModel(primary, max_retries=2)
+    with pytest.raises(type(error)):
+        model.invoke("hi")
+    with pytest.raises(type(error)):
+        asyncio.run(model.ainvoke("hi"))
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("error", [StatusError(429), StatusError(503), TimeoutError("slow"), ConnectionError("reset")])
+def test_transient_errors_are_retried(error):
+    primary, calls = failing(error)
+    model = ResilientChatModel(primary, max_retries=2)
+    with pytest.raises(type(error)):
+        model.invoke("hi")
+    with pytest.raises(type(error)):
+        asyncio.run(model.ainvoke("hi"))
+    assert len(calls) == 6
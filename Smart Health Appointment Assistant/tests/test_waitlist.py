@@ -0,0 +1,35 @@
+import pytest
+from pydantic import ValidationError
+
+from data_models.models import WaitlistEntry
+from toolkit.slot_index import MAX_SEARCH_DAYS
+from toolkit.toolkits import allocate_waitlist
+
+
+def entry(start_date, end_date):
+    return {"id_number": 1000082, "start_date": start_date, "end_date": end_date, "specialization": "orthodontist"}
+
+
+def test_entry_spanning_more_than_the_search_limit_is_rejected():
+    with pytest.raises(ValidationError, match=f"at most {MAX_SEARCH_DAYS} days"):
+        WaitlistEntry(**entry("01-01-0001", "31-12-9999"))
+    with pytest.raises(ValidationError):
+        WaitlistEntry(**entry("01-01-2024", "01-01-2025"))
+
+
+def test_entry_spanning_the_search_limit_is_accepted():
+    assert WaitlistEntry(**entry("01-01-2024", "31-12-2024")).end_date == "31-12-2024"
+
+
+def test_allocate_waitlist_tool_rejects_an_over_long_span(repository):
+    with pytest.raises(ValidationError, match=f"at most {MAX_SEARCH_DAYS} days"):
+        allocate_waitlist.invoke({"entries": [entry("01-01-0001", "31-12-9999")], "commit": False})
+
+
+def test_allocate_endpoint_rejects_an_over_long_span(repository):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    response = TestClient(main.app).post("/waitlist/allocate", json={"entries": [entry("01-01-0001", "31-12-9999")]})
+    assert response.status_code == 422
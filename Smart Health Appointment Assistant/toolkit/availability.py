@@ -0,0 +1,492 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from toolkit.booking_store import BookingStore, RescheduleResult, get_booking_store
+from toolkit.schedule_loader import (
+    MINUTES_PER_DAY,
+    concat_schedules,
+    epoch_minutes,
+    load_schedule,
+    parse_schedule,
+    to_epoch_day,
+    to_epoch_minute,
+)
+from toolkit.slot_index import EPOCH_ORDINAL, SlotBitmapIndex, format_date, format_minute, parse_minute
+from toolkit.waitlist import allocation_order, assign_slots
+
+# SCHEDULE_CSV_PATH points the repository at another schedule, e.g. a synthetic benchmark one
+CSV_FILE = os.getenv(
+    "SCHEDULE_CSV_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "doctor_availability.csv"),
+)
+
+# Bytes re-read from before the last consumed offset to detect in-place edits
+FINGERPRINT_SIZE = 1024
+# Bytes read from the end of the file to find the last complete row
+TAIL_SIZE = 64 * 1024
+# Times a bulk allocation is recomputed when concurrent bookings beat its commit
+ALLOCATION_ATTEMPTS = 3
+
+
+class AvailabilityRepository:
+    """
+    Loads the doctor schedule once and serves lookups from hash indexes.
+
+    The schedule is held as typed columns (see ``schedule_loader``) and indexes
+    map (day, doctor), (day, specialization), (slot, doctor) and patient id to
+    row positions, with days and slots as integer offsets from the Unix epoch.
+    Lookups filter those positions with vectorized NumPy operations over the
+    slot, availability and doctor columns.
+    The backing CSV is checked with a cheap ``os.stat`` before each lookup:
+    appended rows are parsed incrementally, any other change triggers a full
+    reload.
+
+    Booking state is owned by a ``BookingStore``; the repository applies the
+    store's change log to its in-memory copy so reads never hit the store.
+    Loaded rows start from the store's current state of their slots, and a
+    repository that fell behind the store's compacted log reloads.
+
+    Every change bumps ``version`` and the per-date, per-doctor and
+    per-specialization counters returned by ``versions``, which callers use to
+    key caches of derived answers.
+    """
+
+    def __init__(self, csv_path: str = CSV_FILE, store: Optional[BookingStore] = None):
+        self.csv_path = csv_path
+        self.store = store or get_booking_store()
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._frame = pd.DataFrame()
+        self._minutes = np.empty(0, dtype=np.int64)
+        self._available = np.empty(0, dtype=bool)
+        self._doctor_names = np.empty(0, dtype=object)
+        self._columns: List[str] = []
+        self._offset = 0
+        self._fingerprint = b""
+        self._stat: Optional[Tuple[int, int]] = None
+        self._by_doctor: Dict[Tuple[int, str], np.ndarray] = {}
+        self._by_specialization: Dict[Tuple[int, str], np.ndarray] = {}
+        self._by_slot: Dict[Tuple[int, str], int] = {}
+        self._by_patient: Dict[int, List[int]] = defaultdict(list)
+        self.slots = SlotBitmapIndex()
+        self.doctors: Set[str] = set()
+        self.specializations: Set[str] = set()
+        self.generation = 0
+        self.version = 0
+        self._scope_versions: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.refresh()
+
+    # === Loading ===
+
+    def refresh(self) -> None:
+        """
+        Reloads the backing file if it changed since the last load and applies
+        bookings committed to the store since the last refresh.
+        """
+        stat = os.stat(self.csv_path)
+        current = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if current != self._stat:
+                if self._stat is not None and self._is_append_only(stat.st_size):
+                    self._load_appended()
+                else:
+                    self._load_full()
+                self._stat = current
+                self.generation += 1
+                self.version += 1
+            self._sync()
+
+    def _sync(self) -> None:
+        changes = self.store.changes_since(self._seq)
+        if changes is None:
+            self._load_full()
+            self.generation += 1
+            self.version += 1
+            changes = self.store.changes_since(self._seq) or []
+        for seq, date_slot, doctor_name, is_available, patient in changes:
+            self._apply(date_slot, doctor_name, is_available, patient)
+            self._seq = seq
+
+    def _apply(self, date_slot: str, doctor_name: str, is_available: bool, patient: Optional[int]) -> None:
+        position = self._by_slot.get((to_epoch_minute(date_slot), doctor_name))
+        if position is None:
+            return
+        previous = self._frame.at[position, "patient_to_attend"]
+        if not pd.isna(previous) and position in self._by_patient.get(int(previous), []):
+            self._by_patient[int(previous)].remove(position)
+        self._frame.at[position, "is_available"] = is_available
+        self._available[position] = is_available
+        self._frame.at[position, "patient_to_attend"] = pd.NA if patient is None else patient
+        if patient is not None:
+            self._by_patient[patient].append(position)
+        specialization = self._frame.at[position, "specialization"]
+        self.slots.set(date_slot, doctor_name, specialization, is_available)
+        self._bump(date_slot.split(" ")[0], doctor_name, specialization)
+
+    def _bump(self, date: str, doctor_name: str, specialization: str) -> None:
+        self.version += 1
+        self._scope_versions[("date", date)] += 1
+        self._scope_versions[("doctor", doctor_name)] += 1
+        self._scope_versions[("specialization", specialization)] += 1
+
+    def _is_append_only(self, size: int) -> bool:
+        if size < self._offset:
+            return False
+        with open(self.csv_path, "rb") as handle:
+            handle.seek(self._offset - len(self._fingerprint))
+            return handle.read(len(self._fingerprint)) == self._fingerprint
+
+    def _load_full(self) -> None:
+        with open(self.csv_path, "rb") as handle:
+            self._columns = handle.readline().decode().strip().split(",")
+            size = handle.seek(0, os.SEEK_END)
+            handle.seek(max(0, size - TAIL_SIZE))
+            tail = handle.read()
+        body_end = size - len(tail) + tail.rfind(b"\n") + 1
+
+        self._frame = pd.DataFrame()
+        self._minutes = np.empty(0, dtype=np.int64)
+        self._available = np.empty(0, dtype=bool)
+        self._doctor_names = np.empty(0, dtype=object)
+        self._by_doctor.clear()
+        self._by_specialization.clear()
+        self._by_slot.clear()
+        self._by_patient.clear()
+        self.doctors.clear()
+        self.specializations.clear()
+        self.slots.clear()
+        # The loaded rows already carry every booking up to this point
+        self._seq = self._append(load_schedule(self.csv_path, body_end))
+        self._offset = body_end
+        self._fingerprint = tail[:tail.rfind(b"\n") + 1][-FINGERPRINT_SIZE:]
+
+    def _load_appended(self) -> None:
+        with open(self.csv_path, "rb") as handle:
+            handle.seek(self._offset)
+            data = handle.read()
+
+        body_end = data.rfind(b"\n") + 1
+        if body_end == 0:
+            return
+        self._append(parse_schedule(data[:body_end], names=self._columns))
+        self._offset += body_end
+        self._fingerprint = (self._fingerprint + data[:body_end])[-FINGERPRINT_SIZE:]
+
+    def _append(self, rows: pd.DataFrame) -> int:
+        """
+        Adds schedule rows, seeds their slots into the store and applies the
+        store's booking state to them. Returns the store's log position that
+        state reflects.
+        """
+        start = len(self._frame)
+        self._frame = concat_schedules(self._frame, rows)
+
+        positions = np.arange(start, start + len(rows))
+        minutes = epoch_minutes(rows["slot"])
+        available = rows["is_available"].to_numpy(dtype=bool)
+        doctor_names = rows["doctor_name"].to_numpy(dtype=object)
+        self._minutes = np.concatenate([self._minutes, minutes])
+        self._available = np.concatenate([self._available, available])
+        self._doctor_names = np.concatenate([self._doctor_names, doctor_names])
+
+        keys = pd.DataFrame({
+            "day": minutes // MINUTES_PER_DAY,
+            "doctor_name": doctor_names,
+            "specialization": rows["specialization"].to_numpy(dtype=object),
+            "patient": rows["patient_to_attend"].to_numpy(),
+        })
+
+        for index, columns in ((self._by_doctor, ["day", "doctor_name"]), (self._by_specialization, ["day", "specialization"])):
+            for key, group in keys.groupby(columns, observed=True, sort=False).indices.items():
+                existing = index.get(key)
+                index[key] = positions[group] if existing is None else np.concatenate([existing, positions[group]])
+
+        for patient, group in keys.dropna(subset=["patient"]).groupby("patient", sort=False).indices.items():
+            self._by_patient[int(patient)].extend(positions[group].tolist())
+
+        doctors = doctor_names.tolist()
+        self._by_slot.update(zip(zip(minutes.tolist(), doctors), positions.tolist()))
+        self.doctors.update(rows["doctor_name"].unique())
+        self.specializations.update(rows["specialization"].unique())
+
+        for minute, doctor, specialization in zip(
+            minutes[available].tolist(),
+            doctor_names[available].tolist(),
+            keys["specialization"][available].tolist(),
+        ):
+            self.slots.set_bits(minute // MINUTES_PER_DAY + EPOCH_ORDINAL, minute % MINUTES_PER_DAY, doctor, specialization, True)
+
+        # Schedules repeat the same few slot times, so format each distinct one once
+        codes, unique_slots = pd.factorize(rows["slot"])
+        date_slots = np.asarray(unique_slots.strftime("%d-%m-%Y %H:%M"), dtype=object)[codes].tolist()
+        patients = rows["patient_to_attend"].tolist()
+        seq, overrides = self.store.seed(
+            (date_slot, doctor, bool(is_available), None if pd.isna(patient) else int(patient))
+            for date_slot, doctor, is_available, patient in zip(date_slots, doctors, available.tolist(), patients)
+        )
+        for date_slot, doctor, is_available, patient in overrides:
+            self._apply(date_slot, doctor, is_available, patient)
+        return seq
+
+    # === Lookups ===
+
+    def available_slots_by_doctor(self, date: str, doctor_name: str) -> List[str]:
+        """
+        Returns the free 'HH:MM' slots of a doctor on a 'DD-MM-YYYY' date.
+        """
+        self.refresh()
+        with self._lock:
+            positions = self._free(self._by_doctor.get((to_epoch_day(date), doctor_name)))
+            return [format_minute(minute) for minute in (self._minutes[positions] % MINUTES_PER_DAY).tolist()]
+
+    def available_slots_by_specialization(self, date: str, specialization: str) -> Dict[str, List[str]]:
+        """
+        Returns the free 'HH:MM' slots per doctor of a specialization on a 'DD-MM-YYYY' date.
+        """
+        self.refresh()
+        with self._lock:
+            positions = self._free(self._by_specialization.get((to_epoch_day(date), specialization)))
+            slots: Dict[str, List[str]] = {}
+            for doctor, minute in zip(
+                self._doctor_names[positions].tolist(), (self._minutes[positions] % MINUTES_PER_DAY).tolist()
+            ):
+                slots.setdefault(doctor, []).append(format_minute(minute))
+            return dict(sorted(slots.items()))
+
+    def is_available(self, date_slot: str, doctor_name: str) -> bool:
+        """
+        Checks whether a 'DD-MM-YYYY HH:MM' slot of a doctor is free.
+        """
+        self.refresh()
+        with self._lock:
+            position = self._by_slot.get((to_epoch_minute(date_slot), doctor_name))
+            return position is not None and bool(self._available[position])
+
+    def appointments_for_patient(self, id_number: int) -> pd.DataFrame:
+        """
+        Returns the rows booked by a patient.
+        """
+        self.refresh()
+        with self._lock:
+            return self._rows(self._by_patient.get(id_number, []))
+
+    def next_available(self, start_date: str, days: int = 30, **filters) -> Optional[Tuple[str, str, List[str]]]:
+        """
+        Returns the earliest free (date, time, doctors) from ``start_date`` on.
+        See ``SlotBitmapIndex.find_next`` for the filters.
+        """
+        self.refresh()
+        return self.slots.find_next(start_date, days, **filters)
+
+    def availability_range(self, start_date: str, end_date: str, **filters) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Returns the free slots per date and doctor between two dates.
+        See ``SlotBitmapIndex.free_in_range`` for the filters.
+        """
+        self.refresh()
+        return self.slots.free_in_range(start_date, end_date, **filters)
+
+    def versions(
+        self, dates: Iterable[str] = (), doctors: Iterable[str] = (), specializations: Iterable[str] = ()
+    ) -> Tuple[int, ...]:
+        """
+        Returns a token that changes whenever slots of the given dates, doctors or
+        specializations change. With no scope it tracks every change.
+        """
+        self.refresh()
+        with self._lock:
+            scopes = (
+                [("date", date) for date in sorted(dates)]
+                + [("doctor", doctor) for doctor in sorted(doctors)]
+                + [("specialization", specialization) for specialization in sorted(specializations)]
+            )
+            if not scopes:
+                return (self.generation, self.version)
+            return (self.generation,) + tuple(self._scope_versions[scope] for scope in scopes)
+
+    def _rows(self, positions) -> pd.DataFrame:
+        return self._frame.iloc[positions]
+
+    def _free(self, positions: Optional[np.ndarray]) -> np.ndarray:
+        if positions is None:
+            return np.empty(0, dtype=np.int64)
+        return positions[self._available[positions]]
+
+    def _candidates(
+        self,
+        columns: Dict[str, np.ndarray],
+        specialization: Optional[str],
+        doctor_name: Optional[str],
+        start_date: str,
+        end_date: str,
+        earliest: str,
+        latest: str,
+        needs_assistant: bool,
+    ) -> np.ndarray:
+        """
+        Free positions matching one set of waitlist preferences, earliest first.
+        """
+        days = range(to_epoch_day(start_date), to_epoch_day(end_date) + 1)
+        if doctor_name is not None:
+            parts = [self._by_doctor.get((day, doctor_name)) for day in days]
+        elif specialization is not None:
+            parts = [self._by_specialization.get((day, specialization)) for day in days]
+        else:
+            parts = [np.flatnonzero(
+                (self._minutes >= days.start * MINUTES_PER_DAY) & (self._minutes < days.stop * MINUTES_PER_DAY)
+            )]
+        parts = [part for part in parts if part is not None]
+        positions = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+        if doctor_name is not None and specialization is not None:
+            code = self._frame["specialization"].cat.categories.get_indexer([specialization])[0]
+            positions = positions[columns["specialization"][positions] == code]
+        minute_of_day = self._minutes[positions] % MINUTES_PER_DAY
+        keep = self._available[positions] & (minute_of_day >= parse_minute(earliest)) & (minute_of_day <= parse_minute(latest))
+        if needs_assistant:
+            keep &= columns["assistant_present"][positions]
+        positions = positions[keep]
+        return positions[np.argsort(self._minutes[positions], kind="stable")]
+
+    def _plan(self, requests: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        if not requests or self._frame.empty:
+            return [], [request["id_number"] for request in requests]
+
+        columns = {
+            "specialization": self._frame["specialization"].cat.codes.to_numpy(),
+            "assistant_present": self._frame["assistant_present"].to_numpy(dtype=bool),
+        }
+        groups, candidates, group_of = [], [], {}
+        for request in requests:
+            key = (
+                request.get("specialization"),
+                request.get("doctor_name"),
+                request["start_date"],
+                request["end_date"],
+                request.get("earliest_time", "00:00"),
+                request.get("latest_time", "23:59"),
+                bool(request.get("needs_assistant", False)),
+            )
+            if key not in group_of:
+                group_of[key] = len(candidates)
+                candidates.append(self._candidates(columns, *key))
+            groups.append(group_of[key])
+
+        # Rooms in use are keyed by (minute, room) across every day the waitlist asks for
+        rooms = self._frame["room_number"].cat.codes.to_numpy().astype(np.int64)
+        room_count = len(self._frame["room_number"].cat.categories) + 1
+        first = min(to_epoch_day(request["start_date"]) for request in requests) * MINUTES_PER_DAY
+        last = (max(to_epoch_day(request["end_date"]) for request in requests) + 1) * MINUTES_PER_DAY
+        in_use = np.flatnonzero((self._minutes >= first) & (self._minutes < last) & ~self._available)
+        occupied = set((self._minutes[in_use] * room_count + rooms[in_use]).tolist())
+
+        chosen = assign_slots(
+            groups,
+            candidates,
+            allocation_order([request.get("priority", 0) for request in requests], [len(candidates[group]) for group in groups]),
+            [request["id_number"] for request in requests],
+            self._minutes,
+            rooms,
+            room_count,
+            occupied,
+        )
+
+        unassigned = [request["id_number"] for request, position in zip(requests, chosen) if position is None]
+        booked = [(request["id_number"], position) for request, position in zip(requests, chosen) if position is not None]
+        positions = np.array([position for _, position in booked], dtype=np.int64)
+        minutes = self._minutes[positions].tolist()
+        assigned = [
+            {
+                "id_number": id_number,
+                "date_slot": f"{format_date(minute // MINUTES_PER_DAY + EPOCH_ORDINAL)} {format_minute(minute % MINUTES_PER_DAY)}",
+                "doctor_name": doctor_name,
+                "specialization": specialization,
+                "room_number": room_number,
+            }
+            for (id_number, _), minute, doctor_name, specialization, room_number in zip(
+                booked,
+                minutes,
+                self._doctor_names[positions].tolist(),
+                self._frame["specialization"].iloc[positions].tolist(),
+                self._frame["room_number"].iloc[positions].tolist(),
+            )
+        ]
+        return assigned, unassigned
+
+    # === Mutations ===
+
+    def book(self, date_slot: str, doctor_name: str, id_number: int) -> bool:
+        """
+        Assigns a free slot to a patient. Returns False if the slot is not free.
+        """
+        booked = self.store.book(date_slot, doctor_name, id_number)
+        self.refresh()
+        return booked
+
+    def cancel(self, date_slot: str, doctor_name: str, id_number: int) -> bool:
+        """
+        Frees a slot held by a patient. Returns False if the patient holds no such slot.
+        """
+        cancelled = self.store.cancel(date_slot, doctor_name, id_number)
+        self.refresh()
+        return cancelled
+
+    def reschedule(self, old_date_slot: str, new_date_slot: str, doctor_name: str, id_number: int) -> RescheduleResult:
+        """
+        Moves a patient's booking to another slot of the same doctor atomically.
+        """
+        result = self.store.reschedule(old_date_slot, new_date_slot, doctor_name, id_number)
+        self.refresh()
+        return result
+
+    def allocate(
+        self, requests: Sequence[Dict[str, Any]], commit: bool = True, attempts: int = ALLOCATION_ATTEMPTS
+    ) -> Dict[str, Any]:
+        """
+        Assigns free slots to a waitlist in bulk.
+
+        Each request is a dict with ``id_number``, ``start_date`` and ``end_date``
+        ('DD-MM-YYYY'), and optionally ``specialization``, ``doctor_name``,
+        ``earliest_time`` / ``latest_time`` ('HH:MM'), ``needs_assistant`` and
+        ``priority``. A room is never given to two appointments at the same
+        time (see ``toolkit.waitlist`` for the allocation order).
+
+        With ``commit`` the allocation is booked in one store transaction; when
+        a concurrent booking takes one of its slots first, it is recomputed up
+        to ``attempts`` times. Returns the ``assigned`` slots, the ``unassigned``
+        patient ids and whether the allocation was ``committed``.
+        """
+        for _ in range(attempts):
+            self.refresh()
+            with self._lock:
+                assigned, unassigned = self._plan(requests)
+            result = {"committed": False, "assigned": assigned, "unassigned": unassigned}
+            if not commit or not assigned:
+                return result
+            if self.store.book_many([(slot["date_slot"], slot["doctor_name"], slot["id_number"]) for slot in assigned]):
+                self.refresh()
+                result["committed"] = True
+                return result
+        return result
+
+
+_repository: Optional[AvailabilityRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_availability_repository() -> AvailabilityRepository:
+    """
+    Returns the process-wide availability repository, loading it on first use.
+    """
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = AvailabilityRepository()
+    return _repository
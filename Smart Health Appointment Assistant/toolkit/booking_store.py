@@ -0,0 +1,356 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Literal, Optional, Sequence, Tuple
+
+DB_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "bookings.db")
+# Changes kept in the log; readers further behind reload the schedule instead
+LOG_RETENTION = int(os.getenv("BOOKING_LOG_RETENTION", "10000"))
+# The log is trimmed back to LOG_RETENTION every this many changes
+COMPACT_EVERY = 1000
+
+# (date_slot, doctor_name, is_available, patient_to_attend)
+SlotState = Tuple[str, str, bool, Optional[int]]
+# (seq, date_slot, doctor_name, is_available, patient_to_attend)
+SlotChange = Tuple[int, str, str, bool, Optional[int]]
+RescheduleResult = Literal["rescheduled", "unavailable", "not_found"]
+
+
+class BookingStore(ABC):
+    """
+    Source of truth for slot bookings.
+
+    Every write is an atomic compare-and-set on a single (date_slot, doctor_name)
+    slot and is appended to a change log, so readers can catch up incrementally
+    with ``changes_since``. Only the latest ``LOG_RETENTION`` changes are kept.
+    """
+
+    @abstractmethod
+    def seed(self, slots: Iterable[SlotState]) -> Tuple[int, List[SlotState]]:
+        """
+        Registers slots from the schedule. Slots already known keep their
+        booking state, unless their schedule row changed since it was last
+        seeded: then the schedule's state replaces it and the change is logged.
+
+        Returns the current log sequence number and the state of every given
+        slot whose booking state differs from its schedule row.
+        """
+
+    @abstractmethod
+    def book(self, date_slot: str, doctor_name: str, id_number: int) -> bool:
+        """
+        Assigns a free slot to a patient. Returns False if the slot is not free.
+        """
+
+    @abstractmethod
+    def book_many(self, bookings: Sequence[Tuple[str, str, int]]) -> bool:
+        """
+        Assigns several (date_slot, doctor_name, id_number) slots in one
+        transaction. Returns False, and books nothing, if any slot is not free.
+        """
+
+    @abstractmethod
+    def cancel(self, date_slot: str, doctor_name: str, id_number: int) -> bool:
+        """
+        Frees a slot held by a patient. Returns False if the patient holds no such slot.
+        """
+
+    @abstractmethod
+    def reschedule(self, old_date_slot: str, new_date_slot: str, doctor_name: str, id_number: int) -> RescheduleResult:
+        """
+        Moves a patient's booking to another slot of the same doctor in one transaction.
+        """
+
+    @abstractmethod
+    def changes_since(self, seq: int) -> Optional[List[SlotChange]]:
+        """
+        Returns the slot changes committed after ``seq``, oldest first, or
+        None if some of them were already compacted away.
+        """
+
+
+class InMemoryBookingStore(BookingStore):
+    """
+    Single-process booking store guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._schedule = {}
+        self._log: List[SlotChange] = []
+        self._seq = 0
+
+    def seed(self, slots):
+        with self._lock:
+            overrides = []
+            for date_slot, doctor_name, is_available, patient in slots:
+                key, row = (date_slot, doctor_name), (is_available, patient)
+                if key not in self._slots:
+                    self._slots[key] = row
+                elif self._schedule[key] != row:
+                    self._set(date_slot, doctor_name, is_available, patient)
+                elif self._slots[key] != row:
+                    overrides.append((date_slot, doctor_name) + self._slots[key])
+                self._schedule[key] = row
+            return self._seq, overrides
+
+    def book(self, date_slot, doctor_name, id_number):
+        with self._lock:
+            if self._slots.get((date_slot, doctor_name), (False, None))[0] is not True:
+                return False
+            self._set(date_slot, doctor_name, False, id_number)
+            return True
+
+    def book_many(self, bookings):
+        with self._lock:
+            keys = [(date_slot, doctor_name) for date_slot, doctor_name, _ in bookings]
+            if len(set(keys)) < len(keys) or any(self._slots.get(key, (False, None))[0] is not True for key in keys):
+                return False
+            for date_slot, doctor_name, id_number in bookings:
+                self._set(date_slot, doctor_name, False, id_number)
+            return True
+
+    def cancel(self, date_slot, doctor_name, id_number):
+        with self._lock:
+            if self._slots.get((date_slot, doctor_name)) != (False, id_number):
+                return False
+            self._set(date_slot, doctor_name, True, None)
+            return True
+
+    def reschedule(self, old_date_slot, new_date_slot, doctor_name, id_number):
+        with self._lock:
+            if self._slots.get((new_date_slot, doctor_name), (False, None))[0] is not True:
+                return "unavailable"
+            if self._slots.get((old_date_slot, doctor_name)) != (False, id_number):
+                return "not_found"
+            self._set(old_date_slot, doctor_name, True, None)
+            self._set(new_date_slot, doctor_name, False, id_number)
+            return "rescheduled"
+
+    def changes_since(self, seq):
+        with self._lock:
+            first = self._seq - len(self._log)
+            if seq < first:
+                return None
+            return self._log[seq - first:]
+
+    def _set(self, date_slot: str, doctor_name: str, is_available: bool, patient: Optional[int]) -> None:
+        self._slots[(date_slot, doctor_name)] = (is_available, patient)
+        self._seq += 1
+        self._log.append((self._seq, date_slot, doctor_name, is_available, patient))
+        if self._seq % COMPACT_EVERY == 0 and len(self._log) > LOG_RETENTION:
+            del self._log[:len(self._log) - LOG_RETENTION]
+
+
+class SQLiteBookingStore(BookingStore):
+    """
+    Booking store backed by SQLite in WAL mode, safe across threads and worker processes.
+
+    Each thread gets its own connection; writes run in ``BEGIN IMMEDIATE``
+    transactions so concurrent bookings of the same slot serialize on the
+    database lock and exactly one of them wins. Each slot also keeps the
+    schedule row it was last seeded from, so edits to the schedule are told
+    apart from bookings.
+    """
+
+    def __init__(self, db_path: str = DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS slots (
+                    date_slot TEXT NOT NULL,
+                    doctor_name TEXT NOT NULL,
+                    is_available INTEGER NOT NULL,
+                    patient_to_attend INTEGER,
+                    schedule_available INTEGER,
+                    schedule_patient INTEGER,
+                    PRIMARY KEY (date_slot, doctor_name)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS slot_changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date_slot TEXT NOT NULL,
+                    doctor_name TEXT NOT NULL,
+                    is_available INTEGER NOT NULL,
+                    patient_to_attend INTEGER
+                );
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(slots)").fetchall()}
+            # Stores created before schedule rows were tracked learn them on the next seed
+            for column in ("schedule_available", "schedule_patient"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE slots ADD COLUMN {column} INTEGER")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connection())
+
+    def seed(self, slots):
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS seeded "
+                "(date_slot TEXT, doctor_name TEXT, is_available INTEGER, patient_to_attend INTEGER, PRIMARY KEY (date_slot, doctor_name))"
+            )
+            conn.execute("DELETE FROM seeded")
+            conn.executemany(
+                "INSERT OR REPLACE INTO seeded VALUES (?, ?, ?, ?)",
+                ((date_slot, doctor, int(available), patient) for date_slot, doctor, available, patient in slots),
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO slots SELECT date_slot, doctor_name, is_available, patient_to_attend, "
+                "is_available, patient_to_attend FROM seeded"
+            )
+            # Rows edited in the schedule since the last seed: the schedule wins
+            edited = conn.execute(
+                "SELECT n.date_slot, n.doctor_name, n.is_available, n.patient_to_attend FROM seeded n "
+                "JOIN slots s ON s.date_slot = n.date_slot AND s.doctor_name = n.doctor_name "
+                "WHERE s.schedule_available IS NOT NULL "
+                "AND (s.schedule_available != n.is_available OR s.schedule_patient IS NOT n.patient_to_attend)"
+            ).fetchall()
+            for date_slot, doctor, available, patient in edited:
+                conn.execute(
+                    "UPDATE slots SET is_available = ?, patient_to_attend = ? WHERE date_slot = ? AND doctor_name = ?",
+                    (available, patient, date_slot, doctor),
+                )
+                self._log(conn, date_slot, doctor, bool(available), patient)
+            conn.execute(
+                "UPDATE slots SET (schedule_available, schedule_patient) = "
+                "(SELECT is_available, patient_to_attend FROM seeded n WHERE n.date_slot = slots.date_slot AND n.doctor_name = slots.doctor_name) "
+                "WHERE EXISTS (SELECT 1 FROM seeded n WHERE n.date_slot = slots.date_slot AND n.doctor_name = slots.doctor_name "
+                "AND (slots.schedule_available IS NOT n.is_available OR slots.schedule_patient IS NOT n.patient_to_attend))"
+            )
+            overrides = conn.execute(
+                "SELECT s.date_slot, s.doctor_name, s.is_available, s.patient_to_attend FROM seeded n "
+                "JOIN slots s ON s.date_slot = n.date_slot AND s.doctor_name = n.doctor_name "
+                "WHERE s.is_available != n.is_available OR s.patient_to_attend IS NOT n.patient_to_attend"
+            ).fetchall()
+            conn.execute("DELETE FROM seeded")
+            return self._last_seq(conn), [(date_slot, doctor, bool(available), patient) for date_slot, doctor, available, patient in overrides]
+
+    def book(self, date_slot, doctor_name, id_number):
+        with self._transaction() as conn:
+            return self._claim(conn, date_slot, doctor_name, id_number)
+
+    def book_many(self, bookings):
+        with self._transaction() as conn:
+            for date_slot, doctor_name, id_number in bookings:
+                if not self._claim(conn, date_slot, doctor_name, id_number):
+                    conn.rollback_pending = True
+                    return False
+            return True
+
+    def cancel(self, date_slot, doctor_name, id_number):
+        with self._transaction() as conn:
+            return self._release(conn, date_slot, doctor_name, id_number)
+
+    def reschedule(self, old_date_slot, new_date_slot, doctor_name, id_number):
+        with self._transaction() as conn:
+            if not self._claim(conn, new_date_slot, doctor_name, id_number):
+                return "unavailable"
+            if not self._release(conn, old_date_slot, doctor_name, id_number):
+                conn.rollback_pending = True
+                return "not_found"
+            return "rescheduled"
+
+    def changes_since(self, seq):
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT seq, date_slot, doctor_name, is_available, patient_to_attend "
+            "FROM slot_changes WHERE seq > ? ORDER BY seq",
+            (seq,),
+        ).fetchall()
+        # Sequence numbers have no gaps, so a missing first change was compacted away
+        first = rows[0][0] if rows else self._last_seq(conn) + 1
+        if first > seq + 1:
+            return None
+        return [(s, date_slot, doctor, bool(available), patient) for s, date_slot, doctor, available, patient in rows]
+
+    @staticmethod
+    def _last_seq(conn) -> int:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'slot_changes'").fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _claim(conn, date_slot: str, doctor_name: str, id_number: int) -> bool:
+        claimed = conn.execute(
+            "UPDATE slots SET is_available = 0, patient_to_attend = ? "
+            "WHERE date_slot = ? AND doctor_name = ? AND is_available = 1",
+            (id_number, date_slot, doctor_name),
+        ).rowcount == 1
+        if claimed:
+            SQLiteBookingStore._log(conn, date_slot, doctor_name, False, id_number)
+        return claimed
+
+    @staticmethod
+    def _release(conn, date_slot: str, doctor_name: str, id_number: int) -> bool:
+        released = conn.execute(
+            "UPDATE slots SET is_available = 1, patient_to_attend = NULL "
+            "WHERE date_slot = ? AND doctor_name = ? AND is_available = 0 AND patient_to_attend = ?",
+            (date_slot, doctor_name, id_number),
+        ).rowcount == 1
+        if released:
+            SQLiteBookingStore._log(conn, date_slot, doctor_name, True, None)
+        return released
+
+    @staticmethod
+    def _log(conn, date_slot: str, doctor_name: str, is_available: bool, patient: Optional[int]) -> None:
+        seq = conn.execute(
+            "INSERT INTO slot_changes (date_slot, doctor_name, is_available, patient_to_attend) VALUES (?, ?, ?, ?)",
+            (date_slot, doctor_name, int(is_available), patient),
+        ).lastrowid
+        if seq % COMPACT_EVERY == 0:
+            conn.execute("DELETE FROM slot_changes WHERE seq <= ?", (seq - LOG_RETENTION,))
+
+
+class _ImmediateTransaction:
+    """
+    Context manager running a write transaction that takes the database lock up front.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> "_ImmediateTransaction":
+        self.rollback_pending = False
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        return self.conn.executemany(*args)
+
+    def executescript(self, script: str):
+        for statement in script.split(";"):
+            if statement.strip():
+                self.conn.execute(statement)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None and not self.rollback_pending:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+def get_booking_store() -> BookingStore:
+    """
+    Builds the booking store selected by the BOOKING_STORE environment variable.
+    Supported values: 'sqlite' (default) and 'memory'.
+    """
+    backend = os.getenv("BOOKING_STORE", "sqlite").lower()
+    if backend == "memory":
+        return InMemoryBookingStore()
+    if backend == "sqlite":
+        return SQLiteBookingStore(os.getenv("BOOKING_DB_PATH", DB_FILE))
+    raise ValueError(f"Unsupported booking store: {backend}")
@@ -0,0 +1,131 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from toolkit.availability import AvailabilityRepository, get_availability_repository
+
+# Words that carry no identity in a name ("Dr. Doe", "doctor jane")
+TITLES = {"dr", "doctor", "prof", "professor", "mr", "mrs", "ms"}
+# Similarity below which a fuzzy match is not trusted, and margin the best match needs over the runner-up
+MIN_SIMILARITY = 0.45
+MIN_MARGIN = 0.1
+
+
+def normalize_name(text: str) -> str:
+    """
+    Lower-cases a name, turns '_' and '-' into spaces, strips punctuation and titles.
+    """
+    words = re.sub(r"[^\w\s]", " ", text.lower().replace("_", " ").replace("-", " ")).split()
+    return " ".join(word for word in words if word not in TITLES)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class Resolution(NamedTuple):
+    name: Optional[str]
+    candidates: List[str]
+
+
+class NameResolver:
+    """
+    Resolves free-text names ("Dr Doe", "john d.", "orthodontics") to canonical ones.
+
+    Built once per catalog:
+
+    * exact lookup of normalized names
+    * every prefix of every name token (a flattened trie), so "john d" narrows
+      to names with a token starting with "john" and one starting with "d"
+    * a trigram inverted index for misspellings, scored by Dice similarity
+
+    A query resolves only when one name is clearly the best match; otherwise
+    the closest names are returned as candidates.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names = sorted(set(names))
+        self._exact: Dict[str, str] = {}
+        self._prefixes: Dict[str, Set[int]] = defaultdict(set)
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        self._gram_counts: List[int] = []
+        for index, name in enumerate(self.names):
+            normalized = normalize_name(name)
+            self._exact.setdefault(normalized, name)
+            for token in normalized.split():
+                for end in range(1, len(token) + 1):
+                    self._prefixes[token[:end]].add(index)
+            grams = trigrams(normalized)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._grams[gram].add(index)
+
+    def _similarities(self, normalized: str, indexes: Optional[Set[int]] = None) -> Dict[int, float]:
+        grams = trigrams(normalized)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for index in self._grams.get(gram, ()):
+                if indexes is None or index in indexes:
+                    shared[index] += 1
+        return {index: 2 * count / (len(grams) + self._gram_counts[index]) for index, count in shared.items()}
+
+    def resolve(self, text: str, limit: int = 5) -> Resolution:
+        normalized = normalize_name(text)
+        if not normalized:
+            return Resolution(None, [])
+        if normalized in self._exact:
+            return Resolution(self._exact[normalized], [])
+
+        matches: Optional[Set[int]] = None
+        for token in normalized.split():
+            indexes = self._prefixes.get(token, set())
+            matches = indexes if matches is None else matches & indexes
+        if matches and len(matches) == 1:
+            return Resolution(self.names[next(iter(matches))], [])
+
+        # Several prefix matches are ranked among themselves; no prefix match falls back to all names
+        scores = self._similarities(normalized, matches or None)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.names[item[0]]))
+        if ranked and ranked[0][1] >= MIN_SIMILARITY and (len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= MIN_MARGIN):
+            return Resolution(self.names[ranked[0][0]], [])
+        candidates = [self.names[index] for index, _ in ranked[:limit]] or [self.names[index] for index in sorted(matches or ())][:limit]
+        return Resolution(None, candidates)
+
+
+class Catalog:
+    """
+    Doctors and specializations found in the loaded schedule, with a resolver for each.
+    """
+
+    def __init__(self, repository: AvailabilityRepository):
+        self.generation = repository.generation
+        self.doctors = sorted(repository.doctors)
+        self.specializations = sorted(repository.specializations)
+        self.doctor_resolver = NameResolver(self.doctors)
+        self.specialization_resolver = NameResolver(self.specializations)
+
+    def resolve_doctor(self, text: str) -> Resolution:
+        return self.doctor_resolver.resolve(text)
+
+    def resolve_specialization(self, text: str) -> Resolution:
+        return self.specialization_resolver.resolve(text)
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """
+    Returns the catalog of the current schedule, rebuilding it after the schedule reloads.
+    """
+    global _catalog
+    repository = get_availability_repository()
+    repository.refresh()
+    if _catalog is None or _catalog.generation != repository.generation:
+        with _catalog_lock:
+            if _catalog is None or _catalog.generation != repository.generation:
+                _catalog = Catalog(repository)
+    return _catalog
@@ -0,0 +1,121 @@
+import io
+import os
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Snapshots are only a startup optimization
+    pa = feather = None
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".cache")
+
+CATEGORY_COLUMNS = ["specialization", "doctor_name", "room_number"]
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_schedule(data: bytes, names: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Parses schedule CSV bytes into typed columns:
+
+    * ``slot``: datetime64 parsed from 'DD-MM-YYYY HH:MM'
+    * ``specialization``, ``doctor_name``, ``room_number``: categorical
+    * ``is_available``, ``assistant_present``: boolean
+    * ``patient_to_attend``: nullable integer
+
+    ``names`` gives the column names when ``data`` has no header row.
+    """
+    frame = pd.read_csv(
+        io.BytesIO(data),
+        header=0 if names is None else None,
+        names=names,
+        dtype={
+            "date_slot": str,
+            "specialization": "category",
+            "doctor_name": "category",
+            "room_number": "category",
+            "patient_to_attend": "Int64",
+            "assistant_present": str,
+        },
+    )
+    frame.insert(0, "slot", pd.to_datetime(frame.pop("date_slot"), format="%d-%m-%Y %H:%M"))
+    frame["is_available"] = frame["is_available"].astype(bool)
+    frame["assistant_present"] = frame["assistant_present"].str.lower().eq("yes")
+    return frame
+
+
+def concat_schedules(frame: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Appends typed rows, merging categories instead of falling back to object columns.
+    """
+    if frame.empty:
+        return rows.reset_index(drop=True)
+    for column in CATEGORY_COLUMNS:
+        categories = frame[column].cat.categories.union(rows[column].cat.categories)
+        frame[column] = frame[column].cat.set_categories(categories)
+        rows[column] = rows[column].cat.set_categories(categories)
+    return pd.concat([frame, rows], ignore_index=True)
+
+
+def epoch_minutes(slots: pd.Series) -> np.ndarray:
+    """
+    Converts a datetime64 column to int64 minutes since the Unix epoch.
+    """
+    return slots.to_numpy().astype("datetime64[m]").astype(np.int64)
+
+
+def to_epoch_minute(date_slot: str) -> int:
+    """
+    Converts a 'DD-MM-YYYY HH:MM' slot to minutes since the Unix epoch.
+    """
+    return int(np.datetime64(datetime.strptime(date_slot, "%d-%m-%Y %H:%M"), "m").astype(np.int64))
+
+
+def to_epoch_day(date: str) -> int:
+    """
+    Converts a 'DD-MM-YYYY' date to days since the Unix epoch.
+    """
+    return int(np.datetime64(datetime.strptime(date, "%d-%m-%Y").date(), "D").astype(np.int64))
+
+
+def _snapshot_path(csv_path: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, os.path.basename(csv_path) + ".arrow")
+
+
+def _fingerprint(csv_path: str) -> bytes:
+    stat = os.stat(csv_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}".encode()
+
+
+def load_schedule(csv_path: str, body_end: int) -> pd.DataFrame:
+    """
+    Loads the first ``body_end`` bytes of the schedule CSV as a typed frame.
+
+    The parsed frame is cached as a memory-mapped Arrow snapshot tagged with the
+    CSV's mtime and size, so later cold starts skip CSV parsing until the file
+    changes. Without pyarrow the CSV is parsed every time.
+    """
+    snapshot = _snapshot_path(csv_path)
+    fingerprint = _fingerprint(csv_path)
+
+    if feather is not None and os.path.exists(snapshot):
+        table = feather.read_table(snapshot, memory_map=True)
+        if (table.schema.metadata or {}).get(b"csv_fingerprint") == fingerprint:
+            return table.to_pandas()
+
+    with open(csv_path, "rb") as handle:
+        frame = parse_schedule(handle.read(body_end))
+
+    if feather is not None:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"csv_fingerprint": fingerprint})
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        temporary = f"{snapshot}.{os.getpid()}.tmp"
+        feather.write_feather(table, temporary)
+        os.replace(temporary, snapshot)
+
+    return frame
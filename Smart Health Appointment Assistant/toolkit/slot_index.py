@@ -0,0 +1,161 @@
+import threading
+from collections import defaultdict
+from datetime import date as Date, datetime
+from typing import Dict, List, Optional, Tuple
+
+# Ordinal of 1970-01-01, to convert epoch days to ``date.toordinal`` values
+EPOCH_ORDINAL = Date(1970, 1, 1).toordinal()
+# Longest span of days a single range or next-available search may cover
+MAX_SEARCH_DAYS = 366
+
+
+def parse_date(value: str) -> int:
+    """
+    Converts a 'DD-MM-YYYY' date to its proleptic ordinal.
+    """
+    return datetime.strptime(value, "%d-%m-%Y").toordinal()
+
+
+def format_date(ordinal: int) -> str:
+    return Date.fromordinal(ordinal).strftime("%d-%m-%Y")
+
+
+def parse_minute(value: str) -> int:
+    """
+    Converts an 'HH:MM' time to minutes since midnight.
+    """
+    hours, minutes = map(int, value.split(":"))
+    return hours * 60 + minutes
+
+
+def format_minute(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def window_mask(earliest: str = "00:00", latest: str = "23:59") -> int:
+    """
+    Bitmask selecting the minutes between two 'HH:MM' times, both inclusive.
+    """
+    first, last = parse_minute(earliest), parse_minute(latest)
+    if not 0 <= first <= last < 24 * 60:
+        raise ValueError(f"Invalid time window {earliest}-{latest}")
+    return ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+
+
+def iter_minutes(mask: int):
+    """
+    Yields the set minutes of a day bitmap in ascending order.
+    """
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class SlotBitmapIndex:
+    """
+    Free slots as one bitmap per doctor and day, with bit ``n`` standing for
+    minute ``n`` after midnight.
+
+    Day bitmaps are also grouped by specialization so range and next-available
+    queries touch one integer per doctor and day instead of scanning rows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._doctor_days: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._specialization_days: Dict[str, Dict[str, Dict[int, int]]] = defaultdict(lambda: defaultdict(dict))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._doctor_days.clear()
+            self._specialization_days.clear()
+
+    def set(self, date_slot: str, doctor_name: str, specialization: str, is_available: bool) -> None:
+        """
+        Marks a 'DD-MM-YYYY HH:MM' slot as free or taken.
+        """
+        day, time = date_slot.split(" ")
+        self.set_bits(parse_date(day), parse_minute(time), doctor_name, specialization, is_available)
+
+    def set_bits(self, ordinal: int, minute: int, doctor_name: str, specialization: str, is_available: bool) -> None:
+        """
+        Marks the slot at ``minute`` after midnight of day ``ordinal`` as free or taken.
+        """
+        bit = 1 << minute
+        with self._lock:
+            for days in (self._doctor_days[doctor_name], self._specialization_days[specialization][doctor_name]):
+                days[ordinal] = (days.get(ordinal, 0) | bit) if is_available else (days.get(ordinal, 0) & ~bit)
+
+    def _candidates(self, doctor_name: Optional[str], specialization: Optional[str]) -> Dict[str, Dict[int, int]]:
+        if specialization is not None:
+            doctors = self._specialization_days.get(specialization, {})
+            if doctor_name is not None:
+                return {doctor_name: doctors[doctor_name]} if doctor_name in doctors else {}
+            return doctors
+        if doctor_name is not None:
+            return {doctor_name: self._doctor_days[doctor_name]} if doctor_name in self._doctor_days else {}
+        return {}
+
+    def find_next(
+        self,
+        start_date: str,
+        days: int = 30,
+        doctor_name: Optional[str] = None,
+        specialization: Optional[str] = None,
+        earliest: str = "00:00",
+        latest: str = "23:59",
+    ) -> Optional[Tuple[str, str, List[str]]]:
+        """
+        Returns the earliest free (date, time, doctors) within ``days`` days of
+        ``start_date`` and inside the daily time window, or None.
+        """
+        if not 1 <= days <= MAX_SEARCH_DAYS:
+            raise ValueError(f"days must be between 1 and {MAX_SEARCH_DAYS}")
+        first_day = parse_date(start_date)
+        mask = window_mask(earliest, latest)
+        with self._lock:
+            candidates = self._candidates(doctor_name, specialization)
+            for ordinal in range(first_day, first_day + days):
+                best, doctors = None, []
+                for doctor, day_bits in candidates.items():
+                    free = day_bits.get(ordinal, 0) & mask
+                    if not free:
+                        continue
+                    minute = (free & -free).bit_length() - 1
+                    if best is None or minute < best:
+                        best, doctors = minute, [doctor]
+                    elif minute == best:
+                        doctors.append(doctor)
+                if best is not None:
+                    return format_date(ordinal), format_minute(best), sorted(doctors)
+        return None
+
+    def free_in_range(
+        self,
+        start_date: str,
+        end_date: str,
+        doctor_name: Optional[str] = None,
+        specialization: Optional[str] = None,
+        earliest: str = "00:00",
+        latest: str = "23:59",
+    ) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Returns the free 'HH:MM' slots per date and doctor between two dates, both inclusive.
+        """
+        first_day, last_day = parse_date(start_date), parse_date(end_date)
+        if not 0 <= last_day - first_day < MAX_SEARCH_DAYS:
+            raise ValueError(f"The date range must run forward and span at most {MAX_SEARCH_DAYS} days")
+        mask = window_mask(earliest, latest)
+        result: Dict[str, Dict[str, List[str]]] = {}
+        with self._lock:
+            candidates = self._candidates(doctor_name, specialization)
+            for ordinal in range(first_day, last_day + 1):
+                for doctor, day_bits in sorted(candidates.items()):
+                    free = day_bits.get(ordinal, 0) & mask
+                    if free:
+                        result.setdefault(format_date(ordinal), {})[doctor] = [
+                            format_minute(minute) for minute in iter_minutes(free)
+                        ]
+        return result
+
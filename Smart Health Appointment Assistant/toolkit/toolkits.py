@@ -1,66 +1,160 @@
-import pandas as pd
-from typing import Literal
-from langchain_core.tools import tool
-from data_models.models import DateModel, DateTimeModel, IdentificationNumberModel
-from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from typing_extensions import Annotated
+from pydantic import Field, ValidationError, create_model
+from langchain_core.tools import BaseTool, StructuredTool, tool
+from data_models.models import AppointmentDate, AppointmentDateTime, AppointmentTime, PatientID, WaitlistEntry
+from toolkit.availability import get_availability_repository
+from toolkit.catalog import Catalog, Resolution, get_catalog
+from toolkit.slot_index import MAX_SEARCH_DAYS, parse_date, parse_minute
 
-CSV_FILE = "../data/doctor_availability.csv"
-OUTPUT_CSV_FILE = "availability.csv"
+# Free text is accepted and resolved against the schedule's catalog inside each tool
+ARGUMENT_DESCRIPTIONS = {
+    "doctor_name": "Doctor's name; partial names such as 'john d.' are resolved to the closest known doctor.",
+    "specialization": "Doctor specialization, e.g. 'orthodontist'.",
+}
+DoctorName = Annotated[str, Field(description=ARGUMENT_DESCRIPTIONS["doctor_name"])]
+Specialization = Annotated[str, Field(description=ARGUMENT_DESCRIPTIONS["specialization"])]
+
+# Catalog values listed in a tool schema; larger catalogs rely on the resolver
+SCHEMA_VALUE_LIMIT = 100
+
+
+def _resolution_error(kind: str, text: str, resolution: Resolution) -> str:
+    if resolution.candidates:
+        return f"The {kind} '{text}' is ambiguous or unknown. Did you mean: {', '.join(resolution.candidates)}?"
+    return f"Unknown {kind} '{text}'"
+
+
+def resolve_names(
+    doctor_name: Optional[str] = None, specialization: Optional[str] = None
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Resolves free-text doctor and specialization names to the catalog's.
+    Returns (doctor_name, specialization, error); ``error`` is set when a
+    given name doesn't resolve to exactly one known name.
+    """
+    catalog = get_catalog()
+    if doctor_name is not None:
+        resolution = catalog.resolve_doctor(doctor_name)
+        if resolution.name is None:
+            return None, None, _resolution_error("doctor", doctor_name, resolution)
+        doctor_name = resolution.name
+    if specialization is not None:
+        resolution = catalog.resolve_specialization(specialization)
+        if resolution.name is None:
+            return None, None, _resolution_error("specialization", specialization, resolution)
+        specialization = resolution.name
+    return doctor_name, specialization, None
+
+
+def search_window_error(
+    start_date: str, end_date: Optional[str] = None, days: Optional[int] = None, earliest: str = "00:00", latest: str = "23:59"
+) -> Optional[str]:
+    """
+    Checks the dates, day count and daily time window of an availability
+    search. Returns a message for the model, or None when they are usable.
+    """
+    try:
+        first_day = parse_date(start_date)
+        last_day = parse_date(end_date) if end_date is not None else first_day
+    except ValueError:
+        return "Please provide valid dates in 'DD-MM-YYYY' format"
+    if last_day < first_day:
+        return "The end date must not be before the start date"
+    if days is not None and days < 1:
+        return "Please search at least 1 day"
+    if (days or last_day - first_day + 1) > MAX_SEARCH_DAYS:
+        return f"Please search at most {MAX_SEARCH_DAYS} days at a time"
+    if parse_minute(latest) < parse_minute(earliest):
+        return "The latest time must not be before the earliest time"
+    return None
+
+
+def resolve_waitlist(entries: List[WaitlistEntry]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Turns waitlist entries into allocation requests with canonical names.
+    Returns the requests and one error per entry whose names don't resolve.
+    """
+    requests, errors = [], []
+    for entry in entries:
+        doctor_name, specialization, error = resolve_names(entry.doctor_name, entry.specialization)
+        if error:
+            errors.append(f"{entry.id_number}: {error}")
+        requests.append({**entry.model_dump(), "doctor_name": doctor_name, "specialization": specialization})
+    return requests, errors
+
+
+def with_catalog(tools: List[BaseTool], catalog: Optional[Catalog] = None) -> List[BaseTool]:
+    """
+    Returns copies of the tools whose doctor and specialization arguments list
+    the values of the loaded schedule, so the model sees the names in use.
+    """
+    catalog = catalog or get_catalog()
+    values = {"doctor_name": catalog.doctors, "specialization": catalog.specializations}
+    generated = []
+    for base in tools:
+        fields = {}
+        for name, known in values.items():
+            field = base.args_schema.model_fields.get(name)
+            if field is None:
+                continue
+            listed = ", ".join(known[:SCHEMA_VALUE_LIMIT]) + (", ..." if len(known) > SCHEMA_VALUE_LIMIT else "")
+            fields[name] = (
+                field.annotation,
+                Field(... if field.is_required() else field.default, description=f"{ARGUMENT_DESCRIPTIONS[name]} Known values: {listed}."),
+            )
+        if not fields:
+            generated.append(base)
+            continue
+        schema = create_model(base.args_schema.__name__, __base__=base.args_schema, **fields)
+        generated.append(
+            StructuredTool.from_function(func=base.func, name=base.name, description=base.description, args_schema=schema)
+        )
+    return generated
 
 
 @tool
 def check_availability_by_doctor(
-    desired_date: DateModel,
-    doctor_name: Literal[
-        'kevin anderson', 'robert martinez', 'susan davis', 'daniel miller',
-        'sarah wilson', 'michael green', 'lisa brown', 'jane smith',
-        'emily johnson', 'john doe'
-    ]
+    desired_date: AppointmentDate,
+    doctor_name: DoctorName
 ):
     """
     Check availability for a specific doctor on a given date.
     """
-    df = pd.read_csv(CSV_FILE)
-    df['date_slot_time'] = df['date_slot'].apply(lambda x: x.split(' ')[-1])
+    doctor_name, _, error = resolve_names(doctor_name=doctor_name)
+    if error:
+        return error
     
-    available_slots = df[
-        (df['date_slot'].str.split(' ').str[0] == desired_date.date) &
-        (df['doctor_name'] == doctor_name) &
-        (df['is_available'] == True)
-    ]['date_slot_time'].tolist()
+    available_slots = get_availability_repository().available_slots_by_doctor(
+        desired_date.date_str, doctor_name
+    )
     
     if not available_slots:
         return "No availability in the entire day"
     
     return (
-        f"Doctor availability for {desired_date.date}\n"
+        f"Doctor availability for {desired_date.date_str}\n"
         f"Available slots: {', '.join(available_slots)}"
     )
 
 
 @tool
 def check_availability_by_specialization(
-    desired_date: DateModel,
-    specialization: Literal[
-        "general_dentist", "cosmetic_dentist", "prosthodontist",
-        "pediatric_dentist", "emergency_dentist", "oral_surgeon", "orthodontist"
-    ]
+    desired_date: AppointmentDate,
+    specialization: Specialization
 ):
     """
     Check availability for doctors by specialization on a given date.
     """
-    df = pd.read_csv(CSV_FILE)
-    df['date_slot_time'] = df['date_slot'].apply(lambda x: x.split(' ')[-1])
-
-    filtered = df[
-        (df['date_slot'].str.split(' ').str[0] == desired_date.date) &
-        (df['specialization'] == specialization) &
-        (df['is_available'] == True)
-    ]
+    _, specialization, error = resolve_names(specialization=specialization)
+    if error:
+        return error
     
-    grouped = filtered.groupby(['specialization', 'doctor_name'])['date_slot_time'].apply(list).reset_index(name='available_slots')
+    grouped = get_availability_repository().available_slots_by_specialization(
+        desired_date.date_str, specialization
+    )
     
-    if grouped.empty:
+    if not grouped:
         return "No availability in the entire day"
     
     def convert_to_am_pm(time_str: str) -> str:
@@ -69,8 +163,8 @@ def check_availability_by_specialization(
         hours = hours % 12 or 12
         return f"{hours}:{minutes:02d} {period}"
     
-    output = f"Doctor availability for {desired_date.date}\n"
-    for _, doctor, slots in grouped.itertuples(index=False):
+    output = f"Doctor availability for {desired_date.date_str}\n"
+    for doctor, slots in grouped.items():
         slot_str = ', \n'.join([convert_to_am_pm(slot) for slot in slots])
         output += f"{doctor}. Available slots:\n{slot_str}\n"
     
@@ -78,115 +172,213 @@ def check_availability_by_specialization(
 
 
 @tool
-def set_appointment(
-    desired_date: DateTimeModel,
-    id_number: IdentificationNumberModel,
-    doctor_name: Literal[
-        'kevin anderson', 'robert martinez', 'susan davis', 'daniel miller',
-        'sarah wilson', 'michael green', 'lisa brown', 'jane smith',
-        'emily johnson', 'john doe'
-    ]
+def find_next_available(
+    start_date: AppointmentDate,
+    doctor_name: Optional[DoctorName] = None,
+    specialization: Optional[Specialization] = None,
+    days: int = 30,
+    earliest_time: Optional[AppointmentTime] = None,
+    latest_time: Optional[AppointmentTime] = None
 ):
     """
-    Set an appointment for a patient with a doctor at a specific datetime.
+    Find the earliest free slot for a doctor or a specialization, searching
+    `days` days from the start date and only between the optional daily times.
     """
-    df = pd.read_csv(CSV_FILE)
+    if doctor_name is None and specialization is None:
+        return "Please provide a doctor name or a specialization"
+    
+    earliest = earliest_time.time_str if earliest_time else "00:00"
+    latest = latest_time.time_str if latest_time else "23:59"
+    error = search_window_error(start_date.date_str, days=days, earliest=earliest, latest=latest)
+    if error:
+        return error
     
-    def convert_datetime_format(dt_str: str) -> str:
-        dt = datetime.strptime(dt_str, "%d-%m-%Y %H:%M")
-        return dt.strftime("%d-%m-%Y %#H.%M")  # Windows-specific, use %-H on Linux/macOS
+    doctor_name, specialization, error = resolve_names(doctor_name, specialization)
+    if error:
+        return error
     
-    formatted_dt = convert_datetime_format(desired_date.date)
+    match = get_availability_repository().next_available(
+        start_date.date_str,
+        days,
+        doctor_name=doctor_name,
+        specialization=specialization,
+        earliest=earliest,
+        latest=latest,
+    )
     
-    match = df[
-        (df['date_slot'] == formatted_dt) &
-        (df['doctor_name'] == doctor_name) &
-        (df['is_available'] == True)
-    ]
+    if match is None:
+        return f"No availability in the {days} days from {start_date.date_str}"
     
-    if match.empty:
-        return "No available appointments for that particular case"
+    date, time, doctors = match
+    return f"Earliest available slot: {date} {time} with {', '.join(doctors)}"
+
+
+@tool
+def check_availability_range(
+    start_date: AppointmentDate,
+    end_date: AppointmentDate,
+    doctor_name: Optional[DoctorName] = None,
+    specialization: Optional[Specialization] = None,
+    earliest_time: Optional[AppointmentTime] = None,
+    latest_time: Optional[AppointmentTime] = None
+):
+    """
+    Check availability for a doctor or a specialization on every date between
+    two dates, optionally only between the given daily times.
+    """
+    if doctor_name is None and specialization is None:
+        return "Please provide a doctor name or a specialization"
+    
+    earliest = earliest_time.time_str if earliest_time else "00:00"
+    latest = latest_time.time_str if latest_time else "23:59"
+    error = search_window_error(start_date.date_str, end_date.date_str, earliest=earliest, latest=latest)
+    if error:
+        return error
+    
+    doctor_name, specialization, error = resolve_names(doctor_name, specialization)
+    if error:
+        return error
     
-    df.loc[
-        (df['date_slot'] == formatted_dt) &
-        (df['doctor_name'] == doctor_name),
-        ['is_available', 'patient_to_attend']
-    ] = [False, id_number.id]
+    free = get_availability_repository().availability_range(
+        start_date.date_str,
+        end_date.date_str,
+        doctor_name=doctor_name,
+        specialization=specialization,
+        earliest=earliest,
+        latest=latest,
+    )
+    
+    if not free:
+        return "No availability in the selected dates"
+    
+    output = ""
+    for date, doctors in free.items():
+        output += f"Doctor availability for {date}\n"
+        for doctor, slots in doctors.items():
+            output += f"{doctor}. Available slots: {', '.join(slots)}\n"
+    
+    return output
+
+
+@tool
+def set_appointment(
+    desired_date: AppointmentDateTime,
+    id_number: PatientID,
+    doctor_name: DoctorName
+):
+    """
+    Set an appointment for a patient with a doctor at a specific datetime.
+    """
+    doctor_name, _, error = resolve_names(doctor_name=doctor_name)
+    if error:
+        return error
+    
+    if not get_availability_repository().book(desired_date.datetime_str, doctor_name, id_number.id_number):
+        return "No available appointments for that particular case"
     
-    df.to_csv(OUTPUT_CSV_FILE, index=False)
     return "Appointment successfully set"
 
 
 @tool
 def cancel_appointment(
-    date: DateTimeModel,
-    id_number: IdentificationNumberModel,
-    doctor_name: Literal[
-        'kevin anderson', 'robert martinez', 'susan davis', 'daniel miller',
-        'sarah wilson', 'michael green', 'lisa brown', 'jane smith',
-        'emily johnson', 'john doe'
-    ]
+    date: AppointmentDateTime,
+    id_number: PatientID,
+    doctor_name: DoctorName
 ):
     """
     Cancel an existing appointment.
     """
-    df = pd.read_csv(CSV_FILE)
-    
-    match = df[
-        (df['date_slot'] == date.date) &
-        (df['patient_to_attend'] == id_number.id) &
-        (df['doctor_name'] == doctor_name)
-    ]
+    doctor_name, _, error = resolve_names(doctor_name=doctor_name)
+    if error:
+        return error
     
-    if match.empty:
+    if not get_availability_repository().cancel(date.datetime_str, doctor_name, id_number.id_number):
         return "You don’t have any appointment matching those specifications"
     
-    df.loc[
-        (df['date_slot'] == date.date) &
-        (df['patient_to_attend'] == id_number.id) &
-        (df['doctor_name'] == doctor_name),
-        ['is_available', 'patient_to_attend']
-    ] = [True, None]
-    
-    df.to_csv(OUTPUT_CSV_FILE, index=False)
     return "Appointment successfully cancelled"
 
 
 @tool
 def reschedule_appointment(
-    old_date: DateTimeModel,
-    new_date: DateTimeModel,
-    id_number: IdentificationNumberModel,
-    doctor_name: Literal[
-        'kevin anderson', 'robert martinez', 'susan davis', 'daniel miller',
-        'sarah wilson', 'michael green', 'lisa brown', 'jane smith',
-        'emily johnson', 'john doe'
-    ]
+    old_date: AppointmentDateTime,
+    new_date: AppointmentDateTime,
+    id_number: PatientID,
+    doctor_name: DoctorName
 ):
     """
     Reschedule an existing appointment to a new datetime.
     """
-    df = pd.read_csv(CSV_FILE)
+    doctor_name, _, error = resolve_names(doctor_name=doctor_name)
+    if error:
+        return error
     
-    available = df[
-        (df['date_slot'] == new_date.date) &
-        (df['is_available'] == True) &
-        (df['doctor_name'] == doctor_name)
-    ]
+    result = get_availability_repository().reschedule(
+        old_date.datetime_str, new_date.datetime_str, doctor_name, id_number.id_number
+    )
     
-    if available.empty:
+    if result == "unavailable":
         return "No available slots at the desired time"
     
-    cancel_appointment.invoke({
-        'date': old_date,
-        'id_number': id_number,
-        'doctor_name': doctor_name
-    })
-    
-    set_appointment.invoke({
-        'desired_date': new_date,
-        'id_number': id_number,
-        'doctor_name': doctor_name
-    })
+    if result == "not_found":
+        return "You don’t have any appointment matching those specifications"
     
     return "Appointment successfully rescheduled"
+
+
+@tool
+def allocate_waitlist(
+    entries: List[WaitlistEntry],
+    commit: bool = True
+):
+    """
+    Book slots for many waitlisted patients at once, honouring each patient's
+    date range, time window, doctor or specialization and assistant needs.
+    Set commit to False to preview the allocation without booking.
+    """
+    requests, errors = resolve_waitlist(entries)
+    if errors:
+        return "Please correct these entries:\n" + "\n".join(errors)
+    
+    result = get_availability_repository().allocate(requests, commit=commit)
+    
+    if commit and result["assigned"] and not result["committed"]:
+        return "The slots changed while booking the waitlist, please try again"
+    
+    output = f"{'Allocated' if commit else 'Proposed'} {len(result['assigned'])} of {len(entries)} patients\n"
+    for slot in result["assigned"]:
+        output += f"{slot['id_number']}: {slot['date_slot']} with {slot['doctor_name']} in {slot['room_number']}\n"
+    if result["unassigned"]:
+        output += f"No slot found for: {', '.join(str(id_number) for id_number in result['unassigned'])}\n"
+    
+    return output
+
+
+def tool_call_scope(tool_calls: Iterable[Dict[str, Any]]) -> Optional[Tuple[Set[str], Set[str], Set[str]]]:
+    """
+    Returns the (dates, doctors, specializations) bounding every slot the
+    given availability tool calls read, with names resolved the way the tools
+    resolve them. Date ranges and next-available searches are bounded by their
+    doctor or specialization alone. Returns None when some call can't be
+    bounded, e.g. another tool or arguments the tool rejected.
+    """
+    dates, doctors, specializations = set(), set(), set()
+    for call in tool_calls:
+        args = call.get("args") or {}
+        if call["name"] not in (
+            check_availability_by_doctor.name,
+            check_availability_by_specialization.name,
+            find_next_available.name,
+            check_availability_range.name,
+        ):
+            return None
+        doctor_name, specialization, error = resolve_names(args.get("doctor_name"), args.get("specialization"))
+        if error or (doctor_name is None and specialization is None):
+            return None
+        if "desired_date" in args:
+            try:
+                dates.add(AppointmentDate.model_validate(args["desired_date"]).date_str)
+            except ValidationError:
+                return None
+        doctors.update([doctor_name] if doctor_name else [])
+        specializations.update([specialization] if specialization else [])
+    return dates, doctors, specializations
@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def allocation_order(priorities: Sequence[int], candidate_counts: Sequence[int]) -> List[int]:
+    """
+    Order in which waitlist entries pick slots: higher priority first, then the
+    entries with the fewest candidate slots, then waitlist order.
+    """
+    return sorted(range(len(priorities)), key=lambda index: (-priorities[index], candidate_counts[index], index))
+
+
+def assign_slots(
+    groups: Sequence[int],
+    candidates: Sequence[np.ndarray],
+    order: Sequence[int],
+    patients: Sequence[int],
+    minutes: np.ndarray,
+    rooms: np.ndarray,
+    room_count: int,
+    occupied: set,
+) -> List[Optional[int]]:
+    """
+    Greedily gives every entry the earliest slot among its candidates that is
+    still free, whose room is not in use at that minute and that doesn't
+    clash with another slot already given to the same patient.
+
+    ``groups[i]`` selects entry ``i``'s sorted candidate positions in
+    ``candidates``; entries with the same preferences share a group. ``occupied``
+    holds ``minute * room_count + room`` keys of rooms already in use and is
+    updated in place. Returns the chosen position per entry, or None.
+
+    Taken slots and used rooms stay unusable, so each group keeps a cursor past
+    its unusable prefix and the whole allocation stays close to linear in the
+    number of candidates.
+    """
+    taken = set()
+    patient_minutes = set()
+    cursors: Dict[int, int] = {}
+    result: List[Optional[int]] = [None] * len(groups)
+
+    def usable(position: int) -> bool:
+        return position not in taken and int(minutes[position]) * room_count + int(rooms[position]) not in occupied
+
+    for index in order:
+        group = groups[index]
+        positions = candidates[group]
+        cursor = cursors.get(group, 0)
+        while cursor < len(positions) and not usable(int(positions[cursor])):
+            cursor += 1
+        cursors[group] = cursor
+
+        for offset in range(cursor, len(positions)):
+            position = int(positions[offset])
+            if not usable(position) or (patients[index], int(minutes[position])) in patient_minutes:
+                continue
+            taken.add(position)
+            occupied.add(int(minutes[position]) * room_count + int(rooms[position]))
+            patient_minutes.add((patients[index], int(minutes[position])))
+            result[index] = position
+            break
+
+    return result
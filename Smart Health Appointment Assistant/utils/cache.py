@@ -0,0 +1,119 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from utils.instrumentation import CACHE_REQUESTS
+
+CACHE_TTL = float(os.getenv("AGENT_CACHE_TTL", "300"))
+CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "4096"))
+# When set, caches persist to this SQLite file instead of living in memory
+CACHE_PATH = os.getenv("AGENT_CACHE_PATH")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lower-cases a query and strips punctuation and repeated whitespace so
+    trivially different phrasings share a cache key.
+    """
+    query = query.lower().replace("_", " ")
+    query = re.sub(r"[^\w\s:-]", " ", query)
+    return " ".join(query.split())
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache with LRU eviction and a per-entry TTL.
+    """
+
+    def __init__(self, name: str, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels(self.name, "miss" if entry is None else "hit").inc()
+        return None if entry is None else entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """
+    On-disk cache with the same interface as ``LRUCache``, shared by all
+    workers pointing at the same file. Values must be JSON serializable.
+    """
+
+    def __init__(self, name: str, path: str, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "name TEXT, key TEXT, value TEXT, expires_at REAL, last_access REAL, PRIMARY KEY (name, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (name, last_access)")
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE name = ? AND key = ? AND expires_at > ?", (self.name, key, now)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE cache SET last_access = ? WHERE name = ? AND key = ?", (now, self.name, key)
+                )
+        CACHE_REQUESTS.labels(self.name, "miss" if row is None else "hit").inc()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (self.name, key, json.dumps(value), now + self.ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE name = ? AND key IN ("
+                "SELECT key FROM cache WHERE name = ? ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.name, self.name, self.max_size),
+            )
+
+
+def build_cache(name: str, **kwargs):
+    """
+    Returns an on-disk cache when AGENT_CACHE_PATH is set, an in-memory one otherwise.
+    """
+    if CACHE_PATH:
+        return SQLiteCache(name, CACHE_PATH, **kwargs)
+    return LRUCache(name, **kwargs)
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Builds a stable string key from JSON-serializable parts.
+    """
+    return json.dumps(parts, sort_keys=True, default=str)
+
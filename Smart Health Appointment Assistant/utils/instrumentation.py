@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import Counter, Histogram
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("smart_health")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "agent_request_latency_seconds", "End-to-end HTTP request latency.", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+NODE_LATENCY = Histogram(
+    "agent_node_latency_seconds", "Latency of a single graph node visit.", ["node"], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "agent_llm_latency_seconds", "Latency of a single chat model call.", ["model"], buckets=LATENCY_BUCKETS
+)
+TOOL_LATENCY = Histogram(
+    "agent_tool_latency_seconds", "Latency of a single tool call.", ["tool"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter("agent_llm_tokens_total", "Tokens used by chat model calls.", ["model", "kind"])
+ROUTING_DECISIONS = Counter("agent_routing_decisions_total", "Supervisor routing decisions.", ["next", "source"])
+CACHE_REQUESTS = Counter("agent_cache_requests_total", "Cache lookups by outcome.", ["cache", "result"])
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Sets up structured 'key=value' logging for the agent at the given level.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def _fields(attributes: Dict[str, Any]) -> str:
+    return " ".join(f"{key}={value}" for key, value in attributes.items())
+
+
+@contextmanager
+def span(kind: str, name: str, histogram: Histogram = None, **attributes):
+    """
+    Times a block, records it in ``histogram`` and logs it as one structured line.
+
+    Attributes added to the yielded dict inside the block are logged as well.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is not None:
+            histogram.labels(name).observe(elapsed)
+        if logger.isEnabledFor(logging.INFO):
+            fields = {"kind": kind, "name": name, "status": status, "latency_ms": round(elapsed * 1000, 1)}
+            logger.info("span %s", _fields({**fields, **attributes}))
+
+
+def node_span(node: str, **attributes):
+    """
+    Span for one visit of a graph node.
+    """
+    return span("node", node, NODE_LATENCY, **attributes)
+
+
+def record_routing(next_step: str, source: str, reasoning: str) -> None:
+    """
+    Counts and logs a supervisor routing decision.
+    """
+    ROUTING_DECISIONS.labels(next_step, source).inc()
+    logger.info("routing next=%s source=%s reasoning=%r", next_step, source, reasoning)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that records a span for every chat model and tool call,
+    including token usage reported by the provider.
+
+    Passed in the run config, it is inherited by the react sub-agents as well.
+    """
+
+    def __init__(self):
+        self._started: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name", "unknown")
+        self._started[run_id] = (model, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model, start = self._started.pop(run_id, ("unknown", None))
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.labels(model).observe(elapsed)
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage and response.generations and response.generations[0]:
+            # Streaming responses report usage on the message instead
+            metadata = getattr(getattr(response.generations[0][0], "message", None), "usage_metadata", None) or {}
+            prompt_tokens = metadata.get("input_tokens", 0)
+            completion_tokens = metadata.get("output_tokens", 0)
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+        logger.info(
+            "span kind=llm name=%s status=ok latency_ms=%.1f prompt_tokens=%s completion_tokens=%s",
+            model, elapsed * 1000, prompt_tokens, completion_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        model, _ = self._started.pop(run_id, ("unknown", None))
+        logger.warning("span kind=llm name=%s status=error error=%r", model, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._started[run_id] = ((serialized or {}).get("name", "unknown"), time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish_tool(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, "error")
+
+    def _finish_tool(self, run_id: UUID, status: str) -> None:
+        name, start = self._started.pop(run_id, ("unknown", None))
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        TOOL_LATENCY.labels(name).observe(elapsed)
+        logger.info("span kind=tool name=%s status=%s latency_ms=%.1f", name, status, elapsed * 1000)
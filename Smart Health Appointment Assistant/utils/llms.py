@@ -1,32 +1,438 @@
+import asyncio
 import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Literal, Optional, get_args, get_origin, get_type_hints
+
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from utils.instrumentation import logger
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Fetch and set OpenAI API key from environment
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise EnvironmentError("OPENAI_API_KEY is not set in the environment.")
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+# Backend and model used when none is passed to ``LanguageModel``
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL")
+# Seconds allowed for one attempt, and attempts retried on error or timeout
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Backend raced against the primary once a call outlives the primary's p95 latency
+LLM_HEDGE_BACKEND = os.getenv("LLM_HEDGE_BACKEND")
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL")
+# Connections kept per backend in its shared HTTP client
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "100"))
+
+DEFAULT_MODELS = {
+    "openai": "gpt-4o",
+    "groq": "llama3-70b-8192",
+    "ollama": "llama3",
+    "fake": "fake",
+}
+
+# Latencies kept per model to estimate p95, and samples needed before hedging
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+LLM_THREADS = int(os.getenv("LLM_THREADS", "64"))
+_executor = ThreadPoolExecutor(max_workers=LLM_THREADS, thread_name_prefix="llm")
+# One slot per executor thread. A call abandoned after a timeout keeps its slot
+# until it returns, so under a slow provider new attempts fail fast instead of
+# queueing behind abandoned ones
+_slots = threading.BoundedSemaphore(LLM_THREADS)
+
+
+def _submit(timeout: float, fn: Callable, *args, **kwargs):
+    """
+    Runs ``fn`` on the LLM executor once a slot frees up within ``timeout``
+    seconds. Returns the future, or None if no slot freed up.
+    """
+    if not _slots.acquire(timeout=timeout):
+        return None
+    try:
+        future = _executor.submit(fn, *args, **kwargs)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+# === Backends ===
+
+BACKENDS: Dict[str, Callable[[str], BaseChatModel]] = {}
+
+
+def register_backend(name: str):
+    """
+    Registers a ``model_name -> chat model`` factory under ``name``.
+    """
+    def decorator(factory: Callable[[str], BaseChatModel]):
+        BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def _require_key(variable: str) -> str:
+    value = os.getenv(variable)
+    if not value:
+        raise EnvironmentError(f"{variable} is not set in the environment.")
+    return value
+
+
+_http_clients: Dict[str, Any] = {}
+_http_lock = threading.Lock()
+
+
+def http_clients(backend: str):
+    """
+    Returns the (sync, async) httpx clients shared by every model of ``backend``,
+    so connections are pooled and kept alive across calls.
+    """
+    import httpx
+
+    with _http_lock:
+        if backend not in _http_clients:
+            limits = httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE)
+            _http_clients[backend] = (
+                httpx.Client(limits=limits, timeout=LLM_TIMEOUT),
+                httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT),
+            )
+        return _http_clients[backend]
+
+
+@register_backend("openai")
+def _openai(model_name: str) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    client, async_client = http_clients("openai")
+    # Retries happen in ``ResilientChatModel``, not in the SDK
+    return ChatOpenAI(
+        model=model_name,
+        api_key=_require_key("OPENAI_API_KEY"),
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        http_client=client,
+        http_async_client=async_client,
+    )
+
+
+@register_backend("groq")
+def _groq(model_name: str) -> BaseChatModel:
+    from langchain_groq import ChatGroq
+
+    client, async_client = http_clients("groq")
+    return ChatGroq(
+        model=model_name,
+        api_key=_require_key("GROQ_API_KEY"),
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        http_client=client,
+        http_async_client=async_client,
+    )
+
+
+@register_backend("ollama")
+def _ollama(model_name: str) -> BaseChatModel:
+    from langchain_community.chat_models import ChatOllama
+
+    return ChatOllama(model=model_name, base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model for tests and benchmarks.
+
+    Every call answers ``reply`` after ``latency_ms``. Structured output fills
+    each ``Literal`` field with ``FINISH`` once a named worker has replied and
+    with its first option otherwise, so a supervisor graph routes one hop and
+    then ends.
+    """
+
+    reply: str = os.getenv("FAKE_LLM_REPLY", "The requested slot is available.")
+    latency_ms: float = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._result()
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        hints = get_type_hints(schema)
+
+        def answer(messages: List[Any]) -> Dict[str, Any]:
+            replied = any(getattr(message, "name", None) for message in messages)
+            output = {}
+            for field, hint in hints.items():
+                if get_origin(hint) is Literal:
+                    options = get_args(hint)
+                    output[field] = "FINISH" if replied and "FINISH" in options else options[0]
+                else:
+                    output[field] = self.reply
+            return output
+
+        def run(messages: List[Any]) -> Dict[str, Any]:
+            time.sleep(self.latency_ms / 1000)
+            return answer(messages)
+
+        async def arun(messages: List[Any]) -> Dict[str, Any]:
+            await asyncio.sleep(self.latency_ms / 1000)
+            return answer(messages)
+
+        return RunnableLambda(run, afunc=arun, name="FakeStructuredOutput")
+
+
+@register_backend("fake")
+def _fake(model_name: str) -> BaseChatModel:
+    return FakeChatModel()
+
+
+# === Resilience ===
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies for one model.
+    """
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+def backoff(attempt: int, base: float = 0.25, cap: float = 8.0) -> float:
+    """
+    Exponential backoff with full jitter for the given retry attempt.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# Errors raised by provider SDKs and HTTP clients when a request never got a
+# response (openai/groq, httpx, requests); matched by name so no SDK is imported
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError", "ConnectionError", "Timeout", "TimeoutError"}
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a failed LLM call is worth retrying: timeouts, connection errors,
+    rate limiting (429) and server errors (5xx). Anything else, such as an
+    authentication, validation or output parsing error, fails the same way again.
+    """
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class ResilientChatModel(Runnable):
+    """
+    Wraps a chat model (or a runnable derived from one) with a per-attempt
+    timeout, jittered retries of transient errors (see ``is_transient``) and
+    optional hedging.
+
+    When ``hedge`` is set and an attempt on ``primary`` outlives the primary's
+    observed p95 latency, the same input is sent to ``hedge`` and whichever
+    answers first wins. ``bind_tools`` and ``with_structured_output`` are
+    applied to both models, so the wrapper can stand in for the chat model
+    anywhere in the graph; each derived wrapper tracks its own latencies.
+    """
+
+    def __init__(
+        self,
+        primary: Runnable,
+        hedge: Optional[Runnable] = None,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        tracker: Optional[LatencyTracker] = None,
+    ):
+        self.primary = primary
+        self.hedge = hedge
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.tracker = tracker or LatencyTracker()
+
+    def _derive(self, method: str, *args, **kwargs) -> "ResilientChatModel":
+        return ResilientChatModel(
+            getattr(self.primary, method)(*args, **kwargs),
+            getattr(self.hedge, method)(*args, **kwargs) if self.hedge is not None else None,
+            self.timeout,
+            self.max_retries,
+        )
+
+    def bind_tools(self, tools, **kwargs) -> "ResilientChatModel":
+        return self._derive("bind_tools", tools, **kwargs)
+
+    def with_structured_output(self, schema, **kwargs) -> "ResilientChatModel":
+        return self._derive("with_structured_output", schema, **kwargs)
+
+    def _hedge_delay(self) -> Optional[float]:
+        return self.tracker.p95() if self.hedge is not None else None
+
+    def _attempt(self, input: Any, config: Optional[RunnableConfig], **kwargs) -> Any:
+        start = time.perf_counter()
+        primary = _submit(self.timeout, self.primary.invoke, input, config, **kwargs)
+        if primary is None:
+            raise TimeoutError(f"No LLM thread freed up within {self.timeout}s")
+        futures = {primary: "primary"}
+        try:
+            delay = self._hedge_delay()
+            if delay is not None:
+                done, _ = wait(futures, timeout=delay)
+                # The hedge only runs if a thread is free right away
+                hedge = None if done else _submit(0, self.hedge.invoke, input, config, **kwargs)
+                if hedge is not None:
+                    logger.info("llm_hedge after_ms=%.0f", delay * 1000)
+                    futures[hedge] = "hedge"
+            pending = set(futures)
+            while True:
+                done, pending = wait(
+                    pending, timeout=max(self.timeout - (time.perf_counter() - start), 0), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"LLM call exceeded {self.timeout}s")
+                winner = done.pop()
+                # A failed request only loses the race while the other is still running
+                if winner.exception() is not None and (pending or done):
+                    pending |= done
+                    continue
+                result = winner.result()
+                if futures[winner] == "primary":
+                    self.tracker.record(time.perf_counter() - start)
+                return result
+        finally:
+            # Running calls can't be interrupted, but ones still queued never start
+            for future in futures:
+                future.cancel()
+
+    async def _aattempt(self, input: Any, config: Optional[RunnableConfig], **kwargs) -> Any:
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self.primary.ainvoke(input, config, **kwargs))
+        tasks = {primary}
+        delay = self._hedge_delay()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    logger.info("llm_hedge after_ms=%.0f", delay * 1000)
+                    tasks.add(asyncio.ensure_future(self.hedge.ainvoke(input, config, **kwargs)))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(self.timeout - (time.perf_counter() - start), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    raise TimeoutError(f"LLM call exceeded {self.timeout}s")
+                winner = done.pop()
+                if winner.exception() is not None and (pending or done):
+                    pending |= done
+                    continue
+                result = winner.result()
+                if winner is primary:
+                    self.tracker.record(time.perf_counter() - start)
+                return result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._attempt(input, config, **kwargs)
+            except Exception as ex:
+                if attempt == self.max_retries or not is_transient(ex):
+                    raise
+                logger.warning("llm_retry attempt=%d error=%r", attempt + 1, ex)
+                time.sleep(backoff(attempt))
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._aattempt(input, config, **kwargs)
+            except Exception as ex:
+                if attempt == self.max_retries or not is_transient(ex):
+                    raise
+                logger.warning("llm_retry attempt=%d error=%r", attempt + 1, ex)
+                await asyncio.sleep(backoff(attempt))
+
+
+# === Public entry point ===
+
+_models: Dict[tuple, BaseChatModel] = {}
+_models_lock = threading.Lock()
+
+
+def build_model(backend: str, model_name: Optional[str] = None) -> BaseChatModel:
+    """
+    Returns the shared chat model for ``backend``, constructing it on first use.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}'. Choose from: {', '.join(sorted(BACKENDS))}.")
+    key = (backend, model_name or DEFAULT_MODELS.get(backend))
+    with _models_lock:
+        if key not in _models:
+            _models[key] = BACKENDS[backend](key[1])
+        return _models[key]
 
 
 class LanguageModel:
     """
-    A wrapper class to initialize and return the specified OpenAI language model.
+    A wrapper class to initialize and return the configured chat model.
+
+    The backend ('openai', 'groq', 'ollama' or 'fake') and model default to
+    LLM_BACKEND and LLM_MODEL. Nothing is constructed until ``get_model`` is
+    called, and models of the same backend share one pooled HTTP client.
     """
 
-    def __init__(self, model_name: str = "gpt-4o"):
-        if not model_name:
+    def __init__(self, model_name: Optional[str] = None, backend: Optional[str] = None):
+        self.backend = backend or LLM_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown LLM backend '{self.backend}'. Choose from: {', '.join(sorted(BACKENDS))}.")
+        self.model_name = model_name or LLM_MODEL or DEFAULT_MODELS.get(self.backend)
+        if not self.model_name:
             raise ValueError("A valid model name must be provided.")
-        self.model_name = model_name
-        self.model = ChatOpenAI(model=self.model_name)
+        self.model = None
 
-    def get_model(self):
+    def get_model(self) -> ResilientChatModel:
         """
-        Returns the initialized OpenAI chat model.
+        Returns the chat model wrapped with timeouts, retries and, when
+        LLM_HEDGE_BACKEND is set, hedged requests.
         """
+        if self.model is None:
+            primary = build_model(self.backend, self.model_name)
+            hedge = build_model(LLM_HEDGE_BACKEND, LLM_HEDGE_MODEL) if LLM_HEDGE_BACKEND else None
+            self.model = ResilientChatModel(primary, hedge)
         return self.model
 
 
@@ -0,0 +1,110 @@
+import hashlib
+import os
+from typing import List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+
+# Tokens of earlier turns kept verbatim in the persisted history and in prompts
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# Characters kept per message, and lines kept overall, in the running summary
+SUMMARY_LINE_CHARS = 160
+SUMMARY_MAX_LINES = 30
+
+
+def approx_tokens(message: BaseMessage) -> int:
+    """
+    Cheap token estimate (~4 characters per token plus per-message overhead).
+    """
+    return len(str(message.content)) // 4 + 4
+
+
+def current_turn_start(messages: Sequence[BaseMessage], query: str) -> int:
+    """
+    Returns the index of the latest user message carrying ``query``, where the current turn begins.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if isinstance(message, HumanMessage) and message.content == query:
+            return index
+    return 0
+
+
+def dedupe(messages: Sequence[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """
+    Splits messages into (kept, duplicates), keeping the latest copy of each
+    message with the same type, name and content.
+    """
+    seen = set()
+    kept, duplicates = [], []
+    for message in reversed(messages):
+        key = (message.type, message.name, str(message.content))
+        if key in seen:
+            duplicates.append(message)
+        else:
+            seen.add(key)
+            kept.append(message)
+    return kept[::-1], duplicates
+
+
+def compact_history(messages: Sequence[BaseMessage], query: str, summary: str, budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    Bounds the persisted history at the start of a turn.
+
+    Duplicates are removed, and the oldest earlier-turn messages beyond
+    ``budget`` tokens are folded into the running summary. Returns the
+    ``RemoveMessage`` updates and the new summary.
+    """
+    start = current_turn_start(messages, query)
+    earlier, duplicates = dedupe(messages[:start])
+
+    dropped, used = [], sum(approx_tokens(message) for message in earlier)
+    while earlier and used > budget:
+        message = earlier.pop(0)
+        used -= approx_tokens(message)
+        dropped.append(message)
+
+    if dropped:
+        lines = summary.splitlines() if summary else []
+        lines += [f"- {message.name or message.type}: {str(message.content)[:SUMMARY_LINE_CHARS]}" for message in dropped]
+        summary = "\n".join(lines[-SUMMARY_MAX_LINES:])
+
+    removals = [RemoveMessage(id=message.id) for message in duplicates + dropped if message.id]
+    return removals, summary
+
+
+def history_view(messages: Sequence[BaseMessage], query: str, summary: str, budget: int = HISTORY_TOKEN_BUDGET) -> List[BaseMessage]:
+    """
+    Messages an LLM should see for the current hop: the running summary, the
+    newest deduplicated earlier-turn messages within ``budget`` tokens, and the
+    whole current turn.
+    """
+    start = current_turn_start(messages, query)
+    earlier, _ = dedupe(messages[:start])
+
+    kept, used = [], 0
+    for message in reversed(earlier):
+        used += approx_tokens(message)
+        if used > budget:
+            break
+        kept.append(message)
+
+    view = kept[::-1] + list(messages[start:])
+    if summary:
+        view.insert(0, SystemMessage(content=f"Summary of earlier conversation:\n{summary}"))
+    return view
+
+
+def history_fingerprint(messages: Sequence[BaseMessage], query: str, summary: str, budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Digest of the earlier-turn context an LLM sees along with ``query`` (the
+    summary and the kept earlier messages), or "" on a conversation's first
+    turn. Answers that depend on the conversation are cached under it.
+    """
+    view = history_view(messages, query, summary, budget)
+    earlier = view[:current_turn_start(view, query)]
+    if not earlier:
+        return ""
+    digest = hashlib.sha256()
+    for message in earlier:
+        digest.update(f"{message.type}\0{message.name}\0{message.content}\0".encode())
+    return digest.hexdigest()
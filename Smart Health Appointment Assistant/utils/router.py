@@ -0,0 +1,105 @@
+import re
+import threading
+from typing import Dict, List, Optional
+
+from prompt_library.prompt import agent_keywords, agent_registry
+from utils.memory import current_turn_start
+
+STOPWORDS = {
+    "a", "an", "and", "the", "to", "of", "for", "related", "handles", "responsible",
+    "managing", "tasks", "general", "inquiries", "information",
+}
+
+
+class KeywordRouter:
+    """
+    Deterministic pre-router placed in front of the supervisor LLM.
+
+    It routes the clear-cut hops on its own and returns ``None`` whenever it is
+    not confident, in which case the supervisor falls back to the LLM:
+
+    * a worker has already replied and the query carries no intent for another
+      worker -> FINISH
+    * the query matches the keywords of exactly one worker -> that worker
+    """
+
+    def __init__(
+        self,
+        registry: Dict[str, str] = agent_registry,
+        keywords: Dict[str, List[str]] = agent_keywords,
+    ):
+        self.patterns = {
+            worker: [re.compile(pattern, re.IGNORECASE) for pattern in keywords.get(worker, [])]
+            for worker in registry
+        }
+        self.description_terms = self._distinctive_terms(registry)
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.fallback = 0
+
+    @staticmethod
+    def _distinctive_terms(registry: Dict[str, str]) -> Dict[str, set]:
+        terms = {
+            worker: {word[:6] for word in re.findall(r"[a-z]+", description.lower()) if word not in STOPWORDS}
+            for worker, description in registry.items()
+        }
+        # Keep only the stems that describe a single worker
+        return {
+            worker: own - set().union(*(other for name, other in terms.items() if name != worker))
+            for worker, own in terms.items()
+        }
+
+    def intents(self, query: str) -> Dict[str, int]:
+        """
+        Scores each worker against the query: 2 per keyword hit, 1 per description stem.
+        """
+        stems = {word[:6] for word in re.findall(r"[a-z]+", query.lower())}
+        return {
+            worker: 2 * sum(bool(p.search(query)) for p in patterns) + len(stems & self.description_terms[worker])
+            for worker, patterns in self.patterns.items()
+        }
+
+    def route(self, context: dict) -> Optional[dict]:
+        """
+        Returns a routing decision for the current hop, or None to defer to the LLM.
+        """
+        decision = self._decide(context)
+        with self._lock:
+            if decision is None:
+                self.fallback += 1
+            else:
+                self.fast_path += 1
+        return decision
+
+    def _decide(self, context: dict) -> Optional[dict]:
+        messages = context["messages"]
+        if not messages:
+            return None
+
+        query = context.get("query") or messages[-1].content
+        scores = self.intents(query)
+        matched = {worker for worker, score in scores.items() if score >= 2}
+
+        turn = messages[current_turn_start(messages, query):]
+        replied = {getattr(message, "name", None) for message in turn} & set(self.patterns)
+        if replied:
+            if matched - replied:
+                return None
+            return {"next": "FINISH", "reasoning": f"{', '.join(sorted(replied))} already answered the query."}
+
+        if len(matched) == 1:
+            worker = matched.pop()
+            return {"next": worker, "reasoning": f"Query matches the {worker} intent."}
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns how many hops were routed without the LLM.
+        """
+        with self._lock:
+            total = self.fast_path + self.fallback
+            return {
+                "fast_path": self.fast_path,
+                "llm_fallback": self.fallback,
+                "fast_path_ratio": self.fast_path / total if total else 0.0,
+            }